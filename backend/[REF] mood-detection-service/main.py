@@ -54,8 +54,18 @@ def get_text_detector():
 
 @app.on_event("startup")
 async def startup_event():
-    """Application startup - models will be loaded lazily on first request"""
-    print("Application started - models will be loaded on first request")
+    """Application startup - load both models once per worker before serving"""
+    # Models are loaded in each worker after fork rather than in the gunicorn
+    # master: TensorFlow's runtime thread pools do not survive fork(), so
+    # COW-sharing weights via preload_app would hang the first predict().
+    # Loading here keeps exactly one copy per worker and moves the cold start
+    # off the first user request.
+    for loader in (get_mood_detector, get_text_detector):
+        try:
+            loader()
+        except HTTPException as e:
+            print(f"Model preload skipped, will retry on first request: {e.detail}")
+    print("Application started - models loaded")
 
 # Pydantic models for request/response schemas
 class TextRequest(BaseModel):
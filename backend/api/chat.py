@@ -1,10 +1,12 @@
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
 from models.chat_model import ChatRequest
+from functools import lru_cache
+from typing import Optional
+from api.suicide_detection import parse_integer
+from core.bedrock_client import bedrock_runtime, MODEL_ID, INVOKE_KWARGS, cached_system_blocks, extract_delta_text, iterate_in_bedrock_limit, log_usage, messages_v1_body
 import logging
-import boto3
-import json
-import os
+import orjson
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -20,22 +22,6 @@ router = APIRouter()
 
 headers = {"Cache-Control": "no-cache", "Connection": "keep-alive"}
 
-# Initialize the Bedrock Runtime client
-try:
-    bedrock_runtime = boto3.client(
-        service_name='bedrock-runtime',
-        region_name=os.getenv("AWS_REGION", "us-east-1")
-    )
-    # Log successful connection
-    logger.info("Successfully created Bedrock Runtime client.")
-except Exception as e:
-    # Log failed connection
-    logger.error(f"Failed to create Bedrock client: {e}")
-    bedrock_runtime = None
-
-# Model ID for Nova Lite
-MODEL_ID = "amazon.nova-lite-v1:0"
-
 SYSTEM_PROMPT = """
 **Role & Personality**
 You are Ruby, a warm, supportive, and encouraging daily journaling companion for young people. You listen with empathy, respond in a caring and relatable way, and always try to make the user feel understood and valued. You never criticize or shame. You use simple, friendly, and age-appropriate language.
@@ -75,6 +61,81 @@ Always keep the response short and concise in only 2-3 short sentences.
 """
 
 
+# Static prefix of system[]: identical bytes on every request so Bedrock can
+# serve it from the prompt cache.
+SYSTEM_BLOCKS = cached_system_blocks(SYSTEM_PROMPT)
+
+# Static parts of the request body, serialized once
+SYSTEM_JSON = orjson.dumps(SYSTEM_BLOCKS)
+INFERENCE_CONFIG_JSON = orjson.dumps({
+    "maxTokens": 512,
+    "temperature": 0.5
+})
+
+
+# Fused risk detection: with include_risk the reply starts with a
+# <risk>N</risk> header (same 1-10 scale as /detect-suicide), which is
+# stripped from the stream and logged, saving a separate Bedrock call.
+RISK_HEADER_PROMPT = (
+    "Before your reply, output one line in exactly this form: <risk>N</risk> "
+    "where N is an integer from 1 (no hint) to 10 (very strong hint) rating whether the user's latest "
+    "message contains any hint of suicidal ideation, self-harm intent, or desire to die. "
+    "If unsure or there is any small hint, rate above 5. "
+    "Then write your reply on the next line and never mention the rating in it."
+)
+RISK_HEADER_OPEN = "<risk>"
+RISK_HEADER_CLOSE = "</risk>"
+# Give up on finding a header once this much text has arrived without one
+RISK_HEADER_MAX_CHARS = 32
+
+
+def split_risk_header(buffer: str):
+    """
+    Splits a <risk>N</risk> header off the start of the streamed text.
+    Returns (done, score, rest): done is False while more text is needed,
+    score is None if there was no valid header, and rest is the reply text.
+    """
+    stripped = buffer.lstrip()
+    if not stripped:
+        return False, None, ""
+    if not (stripped.startswith(RISK_HEADER_OPEN) or RISK_HEADER_OPEN.startswith(stripped)):
+        return True, None, buffer
+    end = stripped.find(RISK_HEADER_CLOSE)
+    if end == -1:
+        if len(stripped) > RISK_HEADER_MAX_CHARS:
+            return True, None, buffer
+        return False, None, ""
+    score = parse_integer(stripped[len(RISK_HEADER_OPEN):end])
+    return True, score, stripped[end + len(RISK_HEADER_CLOSE):].lstrip()
+
+
+@lru_cache(maxsize=1024)
+def build_system_json(custom_prompt: Optional[str], mood: Optional[str], risk_score: Optional[float], include_risk: bool = False) -> bytes:
+    """
+    Builds the serialized system[] list: the cached static prompt, followed by
+    the per-request text (custom prompt plus mood/risk) when there is any.
+    Cached so repeated combinations reuse the same bytes.
+    """
+    parts = []
+
+    # Add custom prompt if provided
+    if custom_prompt:
+        parts.append(custom_prompt)
+
+    # Inject risk_score and mood into the system prompt if available
+    if risk_score is not None or mood is not None:
+        parts.append(
+            f"[Current User Mood: {mood if mood is not None else 'Unknown'} | Risk Score: {risk_score if risk_score is not None else 'Unknown'}]"
+        )
+
+    if include_risk:
+        parts.append(RISK_HEADER_PROMPT)
+
+    if not parts:
+        return SYSTEM_JSON
+    return orjson.dumps(SYSTEM_BLOCKS + [{"text": "\n\n".join(parts)}])
+
+
 @router.post("/chat")
 async def chat(request: ChatRequest):
     """
@@ -87,13 +148,13 @@ async def chat(request: ChatRequest):
 
         user_message = request.message
         message_history = request.message_history or []
-        logger.info(f"Request: {request}")
 
-        risk_score = getattr(request, 'risk_score', None)
-        mood = getattr(request, 'mood', None)
-        logger.info(f"Received message: {user_message}")
-        logger.info(f"Message history: {message_history}")
-        logger.info(f"Risk score: {risk_score}, Mood: {mood}")
+        risk_score = request.risk_score
+        mood = request.mood
+        logger.info(
+            "Chat request: msg_len=%d history=%d risk=%s mood=%s",
+            len(user_message or ""), len(message_history), risk_score, mood
+        )
 
         if not user_message:
             raise HTTPException(status_code=400, detail="No message provided.")
@@ -115,69 +176,74 @@ async def chat(request: ChatRequest):
             messages_list.pop(0)  # Remove the first assistant message
 
         
-        # Start with base system prompt
-        system_prompt = SYSTEM_PROMPT
-
-        # Add custom prompt if provided
-        if request.custom_prompt:
-            system_prompt = request.custom_prompt + "\n\n" + system_prompt
-
-        # Inject risk_score and mood into the system prompt if available
-        if risk_score is not None or mood is not None:
-            system_prompt = system_prompt + "\n\n" + (  # ← Use existing system_prompt, not SYSTEM_PROMPT
-                f"[Current User Mood: {mood if mood is not None else 'Unknown'} | Risk Score: {risk_score if risk_score is not None else 'Unknown'}]"
-            )
-
-        # Define the system prompt list
-        system_list = [{"text": system_prompt}]
+        # Define the system prompt list: cached static prompt first, then the
+        # per-request context
+        system_json = build_system_json(request.custom_prompt, mood, risk_score, request.include_risk)
 
         # Construct the request body with the new schema
-        body = json.dumps({
-            "messages": messages_list,
-            "system": system_list,
-            "inferenceConfig": {
-                "maxTokens": 512,
-                "temperature": 0.5
-            },
-            "schemaVersion": "messages-v1"
-        })
-
-        # This generator function will handle the streaming logic
-        async def event_generator():
+        body = messages_v1_body(orjson.dumps(messages_list), system_json, INFERENCE_CONFIG_JSON)
+
+        # This generator function will handle the streaming logic.
+        # It is a plain (sync) generator on purpose: boto3 is blocking, so it
+        # is iterated in the threadpool and the event loop stays free to serve
+        # other chat streams while Bedrock is responding. Each stream holds a
+        # BEDROCK_SEM slot, like every other Bedrock call.
+        def event_generator():
             try:
                 response = bedrock_runtime.invoke_model_with_response_stream(
                     modelId=MODEL_ID,
                     body=body,
                     contentType='application/json',
-                    accept='application/json'
+                    accept='application/json',
+                    **INVOKE_KWARGS
                 )
 
+                streamed_chars = 0
+                # Holds the start of the reply until the risk header is split off
+                header_buffer = "" if request.include_risk else None
                 stream = response.get('body')
                 if stream:
                     for event in stream:
                         chunk = event.get('chunk')
-                        if chunk:
-                            # Parse the JSON response chunk
-                            json_chunk = json.loads(chunk.get('bytes').decode('utf-8'))
-
-                            # The streaming text is now in contentBlockDelta
-                            content_delta = json_chunk.get("contentBlockDelta")
-                            if content_delta:
-                                text_to_yield = content_delta.get("delta").get("text")
-                                logger.info(f"Streaming chunk: {text_to_yield}")
-                                yield text_to_yield
+                        if not chunk:
+                            continue
+                        raw = chunk.get('bytes')
+
+                        # The streaming text is in contentBlockDelta; every
+                        # other event is skipped without a full parse
+                        text_to_yield = extract_delta_text(raw)
+                        if text_to_yield and header_buffer is not None:
+                            header_buffer += text_to_yield
+                            done, fused_score, text_to_yield = split_risk_header(header_buffer)
+                            if not done:
+                                continue
+                            header_buffer = None
+                            logger.info("Fused risk score: %s", fused_score)
+                        if text_to_yield:
+                            if logger.isEnabledFor(logging.DEBUG):
+                                logger.debug("Streaming chunk: %s", text_to_yield)
+                            streamed_chars += len(text_to_yield)
+                            yield text_to_yield
+                        elif b'"metadata"' in raw:
+                            # Final event: token usage, incl. prompt-cache reads
+                            log_usage(orjson.loads(raw).get("metadata", {}).get("usage"))
+
+                if header_buffer:
+                    # Stream ended before the header was complete
+                    yield header_buffer
+                logger.info("Finished streaming response: %d chars", streamed_chars)
 
             except Exception as e:
-                logger.error(f"An error occurred during streaming: {e}")
+                logger.error("An error occurred during streaming: %s", e)
                 # Yield a final error message to the client
                 yield f"ERROR: {str(e)}"
 
-        return StreamingResponse(event_generator(), media_type="text/plain", headers=headers)
+        return StreamingResponse(iterate_in_bedrock_limit(event_generator()), media_type="text/plain", headers=headers)
 
     except HTTPException as e:
         # Re-raise HTTPException to be handled by FastAPI
         raise e
     except Exception as e:
-        logger.error(f"An error occurred during request processing: {e}")
+        logger.error("An error occurred during request processing: %s", e)
         # Catch other exceptions and return a 500 error
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
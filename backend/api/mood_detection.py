@@ -1,10 +1,10 @@
 from fastapi import APIRouter, File, UploadFile, HTTPException
 from fastapi.responses import JSONResponse
+from core.bedrock_client import bedrock_runtime, invoke_model_async
+from core.json_extract import find_json_object
 import logging
-import boto3
-import os
 import base64
-import json
+import orjson
 from dotenv import load_dotenv
 import re
 
@@ -19,18 +19,13 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Initialize Bedrock client
-try:
-    bedrock_runtime = boto3.client(
-        service_name='bedrock-runtime',
-        region_name=os.getenv("AWS_REGION", "us-east-1")
-    )
-    logger.info("Successfully created Bedrock Runtime client for mood detection.")
-except Exception as e:
-    logger.error(f"Failed to create Bedrock client: {e}")
-    bedrock_runtime = None
-
-MODEL_ID = "amazon.nova-lite-v1:0"
+# Compiled once for parsing the model output on every request. Both fence
+# patterns are anchored and restricted to word chars/whitespace so they can't
+# backtrack across the payload.
+_FENCE_OPEN_RE = re.compile(r"^```\w*\n?")
+_FENCE_CLOSE_RE = re.compile(r"\n?```\s*$")
+# Fast path for the expected flat {"mood": ..., "risk_score": ...} object
+_FLAT_JSON_OBJ_RE = re.compile(r"\{[^{}]*\}")
 
 
 @router.post("/mood-detection")
@@ -96,39 +91,41 @@ async def mood_detection(file: UploadFile = File(...)):
             "system": system_list,
             "inferenceConfig": inf_params
         }
-        response = bedrock_runtime.invoke_model(
-            modelId=MODEL_ID,
-            body=json.dumps(native_request),
-            contentType='application/json',
-            accept='application/json'
-        )
-        result = response.get('body').read()
-        result_json = json.loads(result)
+        # Image requests are the slowest Bedrock calls; keep them off the event loop
+        result_json = await invoke_model_async(orjson.dumps(native_request))
 
         mood = None
         risk_score = None
         try:
             text = result_json["output"]["message"]["content"][0]["text"]
 
-            cleaned = re.sub(r"^```[a-zA-Z]*\\n|```$", "", text.strip())
+            cleaned = text.strip()
+            cleaned = _FENCE_OPEN_RE.sub("", cleaned, count=1)
+            cleaned = _FENCE_CLOSE_RE.sub("", cleaned, count=1)
             cleaned = cleaned.strip()
             if not (cleaned.startswith('{') and cleaned.endswith('}')):
-                match = re.search(r'\{.*\}', cleaned, re.DOTALL)
-                if match:
-                    cleaned = match.group(0)
-            logger.info(f"Mood detection output: {cleaned}")
+                # The flat match is only the answer if it starts at the first
+                # brace; otherwise the object is nested and needs the scanner.
+                match = _FLAT_JSON_OBJ_RE.search(cleaned)
+                if match and match.start() == cleaned.find('{'):
+                    json_text = match.group(0)
+                else:
+                    json_text = find_json_object(cleaned)
+                if json_text:
+                    cleaned = json_text
+            logger.debug("Mood detection output: %s", cleaned)
 
-            parsed = json.loads(cleaned)
+            parsed = orjson.loads(cleaned)
             mood = parsed.get("mood")
             risk_score = parsed.get("risk_score")
 
         except Exception as e:
-            logger.error(f"Could not parse mood/risk_score from model output: {e}")
-        logger.info(f"Extracted mood: {mood}, risk_score: {risk_score}")
+            logger.error("Could not parse mood/risk_score from model output: %s", e)
+        logger.info("Extracted mood: %s, risk_score: %s", mood, risk_score)
         return JSONResponse(content={
             "mood": mood,
             "risk_score": risk_score,
         })
     except Exception as e:
-        logger.error(f"Mood detection error: {e}")
+        logger.error("Mood detection error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,11 +1,18 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import Optional
-import boto3
+from typing import Dict, List, Optional, Set, Tuple
+from core.bedrock_client import bedrock_runtime, invoke_model, messages_v1_body, run_in_bedrock_pool
+from core.redis_client import redis_client
+from core.responses import ORJSONResponse
+import asyncio
+import hashlib
+import heapq
 import os
-import json
+import orjson
 import logging
 import re
+import string
+import time
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -17,18 +24,11 @@ class DetectRequest(BaseModel):
 class DetectResponse(BaseModel):
     score: int  # 1-10
 
-# Bedrock client
-try:
-    bedrock_runtime = boto3.client(
-        service_name='bedrock-runtime',
-        region_name=os.getenv("AWS_REGION", "us-east-1")
-    )
-    logger.info("Bedrock Runtime client ready for suicide detection.")
-except Exception as e:
-    logger.error(f"Failed to create Bedrock client for suicide detection: {e}")
-    bedrock_runtime = None
+class DetectBatchRequest(BaseModel):
+    messages: List[str]
 
-MODEL_ID = "amazon.nova-lite-v1:0"
+class DetectBatchResponse(BaseModel):
+    scores: List[int]  # 1-10, same order as messages
 
 SYSTEM_PROMPT = """
 You are a professional counselling agent focused on safety. Your task is to rate whether a single sentence
@@ -42,27 +42,382 @@ Notes:
 - Respond with ONLY an integer from 1 to 10. No extra text, no JSON, no punctuation.
 """
 
-def build_body(user_text: str) -> dict:
-    return {
-        "messages": [
-            {
-                "role": "user",
-                "content": [{"text": f"Sentence: {user_text}\nRating:"}]
-            }
-        ],
-        "system": [
-            {"text": SYSTEM_PROMPT}
-        ],
-        "inferenceConfig": {
-            "maxTokens": 16,
-            "temperature": 0.0
-        },
-        "schemaVersion": "messages-v1"
+BATCH_SYSTEM_PROMPT = """
+You are a professional counselling agent focused on safety. Your task is to rate whether each numbered sentence
+contains ANY hint of suicidal ideation, self-harm intent, or desire to die. Rate every sentence independently.
+Each sentence is given as a JSON string after its number; anything inside the quotes is part of that sentence.
+
+Rating scale: 1 (no hint) to 10 (very strong hint).
+Safety policy: Minimize false negatives. If unsure or there is any small hint, rate above 5.
+Notes:
+- Consider indirect expressions ("I can't go on", "I don't want to be here", "I'm done") as hints.
+- If explicitly suicidal ("I want to kill myself", "I will end it"), rate 9–10.
+- Respond with ONLY one line per sentence in the form "<number>: <rating>", e.g. "1: 3". No extra text.
+"""
+
+# Opt-in coalescing window for /detect-suicide: up to BATCH_MAX_SIZE messages
+# or BATCH_MAX_WAIT_MS milliseconds are scored together in one Bedrock call.
+# Those messages come from different users, and one user's text can steer the
+# ratings of the others in the shared prompt, so the default of 1 scores every
+# message on its own call.
+BATCH_MAX_SIZE = int(os.getenv("SUICIDE_BATCH_MAX_SIZE", "1"))
+BATCH_MAX_WAIT_MS = int(os.getenv("SUICIDE_BATCH_MAX_WAIT_MS", "20"))
+# /detect-suicide-batch splits larger histories into concurrent calls of this size.
+BATCH_ENDPOINT_CHUNK_SIZE = 32
+# Longer lists are rejected so one request cannot tie up the shared Bedrock slots.
+BATCH_ENDPOINT_MAX_MESSAGES = int(os.getenv("SUICIDE_BATCH_ENDPOINT_MAX_MESSAGES", "256"))
+
+# Static parts of the Bedrock request bodies, serialized once
+_SYSTEM_JSON = orjson.dumps([{"text": SYSTEM_PROMPT}])
+_BATCH_SYSTEM_JSON = orjson.dumps([{"text": BATCH_SYSTEM_PROMPT}])
+# The single-message reply is one integer (1-2 tokens), so decoding is capped
+# just above that; a few spare tokens cover a stray prefix like "Rating: ".
+_INFERENCE_JSON = orjson.dumps({"maxTokens": 5, "temperature": 0.0})
+
+_BATCH_LINE_RE = re.compile(r"^\s*(\d+)\s*[:.)]\s*(10|[1-9])\b", re.MULTILINE)
+
+# Weighted risk phrases (same scale as the mood-detection service's
+# concerning_phrases). Explicit first-person phrases (weight >= 9) are scored
+# 10 without calling Bedrock; everything else is left to the model.
+RISK_PHRASES = {
+    "kill myself": 10,
+    "end my life": 10,
+    "take my own life": 10,
+    "commit suicide": 10,
+    "want to die": 9,
+    "wanna die": 9,
+    "better off dead": 9,
+    "suicide": 8,
+    "suicidal": 8,
+    "no reason to live": 8,
+    "hurt myself": 8,
+    "cut myself": 8,
+    "self harm": 8,
+    "overdose": 7,
+    "better off without me": 7,
+    "can't take it anymore": 6,
+    "can't go on": 6,
+    "don't want to be here": 6,
+    "tired of living": 6,
+    "hate myself": 6,
+    "end it": 6,
+    "i'm done": 6,
+    "hopeless": 5,
+    "worthless": 5,
+    "no future": 5,
+    "die": 5,
+    "dead": 5,
+    "death": 5,
+    "kill": 5,
+    "give up": 4,
+    "no point": 4,
+    "disappear": 4,
+    "pills": 4,
+    "alone": 3,
+    "empty": 3,
+    "numb": 3,
+    "goodbye": 3,
+}
+
+# One compiled alternation (longest phrases first) scans the message in a
+# single pass for every phrase.
+_RISK_PHRASE_RE = re.compile(
+    r"\b(?:" + "|".join(re.escape(p) for p in sorted(RISK_PHRASES, key=len, reverse=True)) + r")\b"
+)
+
+# A high score triggers an emergency call, so the 10 shortcut only takes
+# affirmative first-person statements. Anything negated, hypothetical, joking
+# or asked as a question ("I don't want to die") is left to the model.
+_HEDGE_RE = re.compile(
+    r"n't\b|\?|\b(?:not|never|no|nobody|cannot|dont|wont|cant|wouldnt|shouldnt|didnt|doesnt"
+    r"|if|whether|jk|joking|kidding)\b"
+)
+# "kill myself", "end my life": the phrase itself names the speaker. Otherwise
+# "I" has to lead the phrase by at most a few words ("i just want to die").
+_SELF_PHRASE_RE = re.compile(r"\bmy")
+_FIRST_PERSON_LEAD_RE = re.compile(r"\bi\b\S*(?:\s+\S+){0,3}\s*$")
+
+# Only bare greetings and acknowledgements are scored 1 without Bedrock.
+# Short messages are not safe by length alone ("nobody would miss me"), and
+# answers like "yes"/"no" depend on what was asked, so they go to the model.
+_BENIGN_RE = re.compile(
+    r"^(?:(?:hi|hii+|hello|hey|hiya|yo|good (?:morning|afternoon|evening)"
+    r"|thanks|thank you|thx|ty|ok|okay|k|kk|cool|nice|lol|haha+)\W*)+$"
+)
+
+SCORE_CACHE_SIZE = int(os.getenv("SUICIDE_SCORE_CACHE_SIZE", "50000"))
+SCORE_CACHE_TTL = int(os.getenv("SUICIDE_SCORE_CACHE_TTL", "86400"))
+REDIS_KEY_PREFIX = b"sd:"
+
+_PUNCTUATION_TABLE = str.maketrans("", "", string.punctuation)
+
+def build_body(user_text: str) -> bytes:
+    messages = [
+        {
+            "role": "user",
+            "content": [{"text": f"Sentence: {user_text}\nRating:"}]
+        }
+    ]
+    return messages_v1_body(orjson.dumps(messages), _SYSTEM_JSON, _INFERENCE_JSON)
+
+def build_batch_body(user_texts: List[str]) -> bytes:
+    # JSON-quote each message so its own newlines or numbered lists cannot
+    # pose as another message's line.
+    numbered = "\n".join(
+        f"{i}) {orjson.dumps(text).decode()}" for i, text in enumerate(user_texts, start=1)
+    )
+    messages = [
+        {
+            "role": "user",
+            "content": [{"text": f"Sentences:\n{numbered}\nRatings:"}]
+        }
+    ]
+    inference_config = {
+        "maxTokens": 8 * len(user_texts),
+        "temperature": 0.0
     }
+    return messages_v1_body(orjson.dumps(messages), _BATCH_SYSTEM_JSON, orjson.dumps(inference_config))
 
 def parse_integer(text: str) -> Optional[int]:
-    m = re.search(r"\b(10|[1-9])\b", text or "")
-    return int(m.group(1)) if m else None
+    # Single pass over the reply: take the first run of ASCII digits and stop.
+    # Replies are meant to be a bare 1-10, so this usually reads 1-2 chars.
+    if not text:
+        return None
+    n = 0
+    seen = False
+    for ch in text:
+        if "0" <= ch <= "9":
+            n = n * 10 + (ord(ch) - 48)
+            seen = True
+            if n > 10:
+                return None
+        elif seen:
+            break
+    return n if seen and 1 <= n <= 10 else None
+
+def parse_batch_scores(text: str, count: int) -> List[Optional[int]]:
+    # Scores belong to different users, so a reply that repeats or invents a
+    # line number is rejected whole rather than trusted line by line.
+    scores: List[Optional[int]] = [None] * count
+    for m in _BATCH_LINE_RE.finditer(text or ""):
+        idx = int(m.group(1)) - 1
+        if not 0 <= idx < count or scores[idx] is not None:
+            return [None] * count
+        scores[idx] = int(m.group(2))
+    return scores
+
+def invoke_text(body: bytes) -> str:
+    data = invoke_model(body)
+    return (
+        data.get("output", {})
+            .get("message", {})
+            .get("content", [{}])[0]
+            .get("text", "")
+        or ""
+    )
+
+def score_messages(user_texts: List[str]) -> List[Optional[int]]:
+    """Blocking: scores one or more messages with a single Bedrock call."""
+    if len(user_texts) == 1:
+        return [parse_integer(invoke_text(build_body(user_texts[0])))]
+    return parse_batch_scores(invoke_text(build_batch_body(user_texts)), len(user_texts))
+
+
+# Both helpers take text that is already lowercased: callers lower each
+# message once and share it between the prefilter and the cache key.
+def prefilter_score(lowered: str) -> Optional[int]:
+    normalized = " ".join(lowered.replace("\u2019", "'").split())
+    if not _HEDGE_RE.search(normalized):
+        for m in _RISK_PHRASE_RE.finditer(normalized):
+            if RISK_PHRASES[m.group(0)] >= 9 and (
+                _SELF_PHRASE_RE.search(m.group(0))
+                or _FIRST_PERSON_LEAD_RE.search(normalized, 0, m.start())
+            ):
+                return 10
+    if _BENIGN_RE.match(normalized):
+        return 1
+    return None
+
+def cache_key(lowered: str) -> bytes:
+    normalized = " ".join(lowered.translate(_PUNCTUATION_TABLE).split())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+
+
+class ScoreCache:
+    """
+    Bounded GDSF-style score cache. Every entry costs the same, so priority is
+    the aging clock plus the hit count: frequently repeated messages ("ok",
+    "thanks") survive, one-off messages age out first. Entries also expire
+    after ttl seconds so prompt/model changes are picked up.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._entries: Dict[bytes, List] = {}  # key -> [score, hits, priority, expires_at]
+        self._heap: List[Tuple[float, bytes]] = []
+        self._clock = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: bytes) -> Optional[int]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[3] <= time.monotonic():
+            del self._entries[key]
+            return None
+        entry[1] += 1
+        self._bump(key, entry)
+        return entry[0]
+
+    def set(self, key: bytes, score: int):
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[0] = score
+            entry[3] = time.monotonic() + self.ttl
+            return
+        while len(self._entries) >= self.maxsize:
+            self._evict()
+        entry = [score, 1, 0.0, time.monotonic() + self.ttl]
+        self._entries[key] = entry
+        self._bump(key, entry)
+
+    def _bump(self, key: bytes, entry: List):
+        entry[2] = self._clock + entry[1]
+        heapq.heappush(self._heap, (entry[2], key))
+        # Drop stale heap records once they clearly outnumber live entries.
+        if len(self._heap) > 4 * self.maxsize:
+            self._heap = [(e[2], k) for k, e in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def _evict(self):
+        while self._heap:
+            priority, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] == priority:
+                del self._entries[key]
+                self._clock = priority
+                return
+
+
+score_cache = ScoreCache(SCORE_CACHE_SIZE, SCORE_CACHE_TTL)
+
+# Where each score came from, to track how often Bedrock is skipped.
+score_sources = {"prefilter": 0, "local_cache": 0, "redis": 0, "bedrock": 0}
+
+
+async def get_shared_score(key: bytes) -> Optional[int]:
+    if redis_client is None:
+        return None
+    try:
+        cached = await redis_client.get(REDIS_KEY_PREFIX + key)
+    except Exception as e:
+        logger.warning("Redis score lookup failed: %s", e)
+        return None
+    return int(cached) if cached is not None else None
+
+async def set_shared_score(key: bytes, score: int):
+    if redis_client is None:
+        return
+    try:
+        await redis_client.setex(REDIS_KEY_PREFIX + key, SCORE_CACHE_TTL, score)
+    except Exception as e:
+        logger.warning("Redis score store failed: %s", e)
+
+
+class ScoreBatcher:
+    """
+    Coalesces concurrent /detect-suicide requests into batched Bedrock calls.
+    The worker task is started lazily so it always lives on the serving loop.
+    """
+
+    def __init__(self, max_size: int, max_wait_ms: int):
+        self.max_size = max(1, max_size)
+        self.max_wait = max(0, max_wait_ms) / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+
+    async def score(self, text: str) -> Optional[int]:
+        if self.max_size == 1:
+            return (await run_in_bedrock_pool(score_messages, [text]))[0]
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Flush in the background so the next batch can start filling
+            # while this one waits on Bedrock.
+            task = asyncio.create_task(self._flush(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _flush(self, batch: List[Tuple[str, asyncio.Future]]):
+        texts = [text for text, _ in batch]
+        try:
+            scores = await run_in_bedrock_pool(score_messages, texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if len(batch) > 1:
+            logger.info("Scored %d messages in one Bedrock call", len(batch))
+        for (_, future), score in zip(batch, scores):
+            if not future.done():
+                future.set_result(score)
+
+
+score_batcher = ScoreBatcher(BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+
+async def lookup_score(lowered: str, key: bytes) -> Optional[int]:
+    """Scores a lowercased message without Bedrock when possible: prefilter, local cache, then Redis."""
+    prefiltered = prefilter_score(lowered)
+    if prefiltered is not None:
+        score_sources["prefilter"] += 1
+        return prefiltered
+
+    cached = score_cache.get(key)
+    if cached is not None:
+        score_sources["local_cache"] += 1
+        return cached
+
+    cached = await get_shared_score(key)
+    if cached is not None:
+        score_sources["redis"] += 1
+        score_cache.set(key, cached)
+    return cached
+
+async def store_score(key: bytes, score: int):
+    score_sources["bedrock"] += 1
+    score_cache.set(key, score)
+    await set_shared_score(key, score)
+
+def score_response(score: int) -> ORJSONResponse:
+    # Already a valid DetectResponse payload; skip re-validation on the way out.
+    return ORJSONResponse({"score": score})
 
 @router.post("/detect-suicide", response_model=DetectResponse)
 async def detect_suicide(req: DetectRequest):
@@ -73,34 +428,84 @@ async def detect_suicide(req: DetectRequest):
     if not msg:
         raise HTTPException(status_code=400, detail="message is required")
 
-    try:
-        body = json.dumps(build_body(msg))
-
-        resp = bedrock_runtime.invoke_model(
-            modelId=MODEL_ID,
-            body=body,
-            contentType="application/json",
-            accept="application/json",
-        )
-
-        data = json.loads(resp["body"].read())
-        text = (
-            data.get("output", {})
-                .get("message", {})
-                .get("content", [{}])[0]
-                .get("text", "")
-            or ""
-        )
+    lowered = msg.lower()
+    key = cache_key(lowered)
+    cached = await lookup_score(lowered, key)
+    if cached is not None:
+        return score_response(cached)
 
-        score = parse_integer(text)
+    try:
+        score = await score_batcher.score(msg)
         if score is None:
-            logger.warning(f"Could not parse score from model output: {text!r}. Returning 7.")
+            logger.warning("Could not parse score from model output (message length %d). Returning 7.", len(msg))
             score = 7
+        else:
+            await store_score(key, score)
 
-        return DetectResponse(score=score)
+        return score_response(score)
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Suicide detection error: {e}")
-        return DetectResponse(score=7)
\ No newline at end of file
+        logger.error("Suicide detection error: %s", e)
+        return score_response(7)
+
+@router.post("/detect-suicide-batch", response_model=DetectBatchResponse)
+async def detect_suicide_batch(req: DetectBatchRequest):
+    """
+    Scores a whole list of messages (e.g. a chat history) in as few Bedrock
+    calls as possible. Scores come back in the same order as the messages.
+    """
+    if bedrock_runtime is None:
+        raise HTTPException(status_code=500, detail="Bedrock client not initialized")
+
+    if not req.messages:
+        raise HTTPException(status_code=400, detail="messages is required")
+    if len(req.messages) > BATCH_ENDPOINT_MAX_MESSAGES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {BATCH_ENDPOINT_MAX_MESSAGES} messages can be scored per request"
+        )
+    msgs = [m.strip() for m in req.messages]
+    if not all(msgs):
+        raise HTTPException(status_code=422, detail="messages must be non-empty strings")
+
+    lowered = [m.lower() for m in msgs]
+    keys = [cache_key(m) for m in lowered]
+    scores: List[Optional[int]] = await asyncio.gather(*[lookup_score(m, k) for m, k in zip(lowered, keys)])
+
+    pending = [i for i, score in enumerate(scores) if score is None]
+    chunks = [pending[i:i + BATCH_ENDPOINT_CHUNK_SIZE] for i in range(0, len(pending), BATCH_ENDPOINT_CHUNK_SIZE)]
+    results = await asyncio.gather(
+        *[run_in_bedrock_pool(score_messages, [msgs[i] for i in chunk]) for chunk in chunks],
+        return_exceptions=True,
+    )
+
+    for chunk, chunk_scores in zip(chunks, results):
+        if isinstance(chunk_scores, Exception):
+            logger.error("Suicide batch detection error: %s", chunk_scores)
+            chunk_scores = [None] * len(chunk)
+        for i, score in zip(chunk, chunk_scores):
+            if score is None:
+                logger.warning("Could not parse batch score for message %d. Returning 7.", i)
+                score = 7
+            else:
+                await store_score(keys[i], score)
+            scores[i] = score
+
+    return ORJSONResponse({"scores": scores})
+
+
+@router.get("/detect-suicide/stats")
+async def detect_suicide_stats():
+    """
+    Per-worker counters of where detection scores came from, plus the
+    resulting Bedrock bypass rate.
+    """
+    total = sum(score_sources.values())
+    bypassed = total - score_sources["bedrock"]
+    return {
+        "sources": score_sources,
+        "bypass_rate": bypassed / total if total else 0.0,
+        "local_cache_size": len(score_cache),
+    }
@@ -1,12 +1,17 @@
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
-from models.chat_model import ChatRequest
+from core.bedrock_client import bedrock_runtime, cached_system_blocks, stream_json_object_async, messages_v1_body
+from core.json_extract import find_json_object
+from core.redis_client import redis_client
+from core.ttl_cache import TTLCache
 from pydantic import BaseModel
 from typing import List, Optional, Literal
+import hashlib
 import logging
-import boto3
-import json
+import orjson
 import os
+import time
+from datetime import date
+from functools import lru_cache
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -20,8 +25,6 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-headers = {"Cache-Control": "no-cache", "Connection": "keep-alive"}
-
 # Pydantic models for summary endpoint
 class MessageSummary(BaseModel):
     role: str
@@ -39,58 +42,6 @@ class MoodSummaryResponse(BaseModel):
     achievements: List[str]
     isFavorite: bool = False
 
-# Initialize the Bedrock Runtime client
-try:
-    bedrock_runtime = boto3.client(
-        service_name='bedrock-runtime',
-        region_name=os.getenv("AWS_REGION", "us-east-1")
-    )
-    # Log successful connection
-    logger.info("Successfully created Bedrock Runtime client.")
-except Exception as e:
-    # Log failed connection
-    logger.error(f"Failed to create Bedrock client: {e}")
-    bedrock_runtime = None
-
-# Model ID for Nova Lite
-MODEL_ID = "amazon.nova-lite-v1:0"
-
-CHAT_SYSTEM_PROMPT = """
-**Role & Personality**
-You are Ruby, a warm, supportive, and encouraging daily journaling companion for young people. You listen with empathy, respond in a caring and relatable way, and always try to make the user feel understood and valued. You never criticize or shame. You use simple, friendly, and age-appropriate language.
-
-**Core Goals**
-1. Help users express their feelings safely.
-2. Provide gentle encouragement and positive reinforcement.
-3. Suggest healthy coping strategies (e.g., journaling, breathing exercises, grounding techniques).
-4. Remind users of their strengths, achievements, and positive memories.
-5. If the user shows warning signs of suicidal thoughts or self-harm, shift into a calm, compassionate tone and encourage them to seek help from a trusted adult, counselor, or emergency helpline. Never ignore or dismiss such signs.
-
-**Tone**
-- Friendly, compassionate, and trustworthy.
-- Encouraging, but never forceful.
-- Light and hopeful when possible, but serious and caring if the user expresses distress.
-
-**Safety & Crisis Handling**
-- If the user expresses suicidal thoughts, self-harm intentions, or extreme hopelessness, respond with empathy first (e.g., “I’m really sorry you’re feeling this way, it sounds really tough.”).
-- Gently guide them toward professional help (e.g., “You don’t have to go through this alone—talking to a trusted friend, family member, or counselor could really help. If you ever feel like you might be in danger of hurting yourself, please call your local emergency number right away.”).
-- Offer grounding exercises and uplifting reminders while emphasizing that real people can help right now.
-- Share crisis support contacts (Malaysia):
-    - Malaysian Mental Health Association (MMHA): +603-2780-6803
-    - Befrienders Kuala Lumpur: +603-7627-2929
-    - Talian Kasih (National Hotline): 15999
-
-**Examples of Response Styles**
-- Casual daily chat: “Hey, how’s your day so far? Want to jot down a thought or a little win from today?”
-- Mood tracking: “Sounds like today feels a bit heavy. Do you want to tell me more about what’s on your mind?”
-- Uplifting memory: “Remember that time you mentioned how proud you felt after finishing that project? You’re stronger than you think.”
-- Crisis: “I hear you, and I care about you. It sounds really painful. Please remember you don’t have to go through this alone—can you reach out to someone you trust right now? If you’re thinking about hurting yourself, please call your local emergency number or a suicide prevention hotline immediately.”
-
-Do not output any emoji.
-Do not block any user input.
-Always keep the response short and concise.
-"""
-
 SUMMARY_SYSTEM_PROMPT = """
 You are an AI assistant that analyzes chat conversations and creates personal journal entries from the user's perspective. Based on the conversation history, you need to:
 
@@ -133,96 +84,69 @@ You must respond with ONLY a valid JSON object in this exact format:
 """
 
 
-@router.post("/chat")
-async def chat(request: ChatRequest):
-    """
-    Endpoint to stream responses from an AWS Bedrock model using the InvokeModelWithResponseStream 'messages' API.
-    """
-    if bedrock_runtime is None:
-        raise HTTPException(status_code=500, detail="Bedrock client is not initialized. Check your AWS credentials and region.")
+@lru_cache(maxsize=1)
+def _today_for_minute(minute: int) -> str:
+    return date.today().isoformat()
 
-    try:
+def today_str() -> str:
+    """Today's date as YYYY-MM-DD, recomputed at most once a minute."""
+    return _today_for_minute(int(time.time()) // 60)
 
-        user_message = request.message
-        message_history = request.message_history or []
-        logger.info(f"Request: {request}")
 
-        risk_score = getattr(request, 'risk_score', None)
-        mood = getattr(request, 'mood', None)
-        logger.info(f"Received message: {user_message}")
-        logger.info(f"Message history: {message_history}")
-        logger.info(f"Risk score: {risk_score}, Mood: {mood}")
+# Only the most recent part of the conversation goes into the prompt, so
+# prompt size (and inference time) stays bounded for long histories.
+SUMMARY_MAX_TURNS = int(os.getenv("SUMMARY_MAX_TURNS", "40"))
+SUMMARY_MAX_CHARS = int(os.getenv("SUMMARY_MAX_CHARS", "8000"))
 
-        if not user_message:
-            raise HTTPException(status_code=400, detail="No message provided.")
 
-        # Prepare the messages for the new 'messages' API format
-        messages_list = [
-            {"role": msg.role, "content": [{"text": msg.content}]}
-            for msg in message_history
-        ]
-        messages_list.append({"role": "user", "content": [{"text": user_message}]})
+# Summaries keyed on the exact conversation text sent to the model (an
+# in-process TTL LRU, plus Redis when configured), so retries and page
+# refreshes skip Bedrock. Entries are stored without the date, which is
+# filled in when served.
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "5000"))
+SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", "86400"))
+REDIS_KEY_PREFIX = b"sum:"
 
-        # Inject risk_score and mood into the system prompt if available
-        system_prompt = CHAT_SYSTEM_PROMPT
-        if risk_score is not None or mood is not None:
-            system_prompt = CHAT_SYSTEM_PROMPT + "\n\n" + (
-                f"[Current User Mood: {mood if mood is not None else 'Unknown'} | Risk Score: {risk_score if risk_score is not None else 'Unknown'}]"
-            )
 
-        # Define the system prompt list
-        system_list = [{"text": system_prompt}]
-
-        # Construct the request body with the new schema
-        body = json.dumps({
-            "messages": messages_list,
-            "system": system_list,
-            "inferenceConfig": {
-                "maxTokens": 512,
-                "temperature": 0.5
-            },
-            "schemaVersion": "messages-v1"
-        })
-
-        # This generator function will handle the streaming logic
-        async def event_generator():
-            try:
-                response = bedrock_runtime.invoke_model_with_response_stream(
-                    modelId=MODEL_ID,
-                    body=body,
-                    contentType='application/json',
-                    accept='application/json'
-                )
-
-                stream = response.get('body')
-                if stream:
-                    for event in stream:
-                        chunk = event.get('chunk')
-                        if chunk:
-                            # Parse the JSON response chunk
-                            json_chunk = json.loads(chunk.get('bytes').decode('utf-8'))
-
-                            # The streaming text is now in contentBlockDelta
-                            content_delta = json_chunk.get("contentBlockDelta")
-                            if content_delta:
-                                text_to_yield = content_delta.get("delta").get("text")
-                                logger.info(f"Streaming chunk: {text_to_yield}")
-                                yield text_to_yield
-
-            except Exception as e:
-                logger.error(f"An error occurred during streaming: {e}")
-                # Yield a final error message to the client
-                yield f"ERROR: {str(e)}"
-
-        return StreamingResponse(event_generator(), media_type="text/plain", headers=headers)
+def summary_cache_key(conversation_text: str) -> bytes:
+    return hashlib.blake2b(conversation_text.encode("utf-8"), digest_size=16).digest()
 
-    except HTTPException as e:
-        # Re-raise HTTPException to be handled by FastAPI
-        raise e
+
+summary_cache = TTLCache(SUMMARY_CACHE_SIZE, SUMMARY_CACHE_TTL)
+
+
+async def get_cached_summary(key: bytes) -> Optional[dict]:
+    summary = summary_cache.get(key)
+    if summary is not None or redis_client is None:
+        return summary
+    try:
+        cached = await redis_client.get(REDIS_KEY_PREFIX + key)
+    except Exception as e:
+        logger.warning("Redis summary lookup failed: %s", e)
+        return None
+    if cached is None:
+        return None
+    summary = orjson.loads(cached)
+    summary_cache.set(key, summary)
+    return summary
+
+async def set_cached_summary(key: bytes, summary: dict):
+    summary_cache.set(key, summary)
+    if redis_client is None:
+        return
+    try:
+        await redis_client.setex(REDIS_KEY_PREFIX + key, SUMMARY_CACHE_TTL, orjson.dumps(summary))
     except Exception as e:
-        logger.error(f"An error occurred during request processing: {e}")
-        # Catch other exceptions and return a 500 error
-        raise HTTPException(status_code=500, detail=str(e))
+        logger.warning("Redis summary store failed: %s", e)
+
+
+# Static parts of the summary request body, serialized once
+# (with a prompt-cache checkpoint after the static system prompt)
+SUMMARY_SYSTEM_JSON = orjson.dumps(cached_system_blocks(SUMMARY_SYSTEM_PROMPT))
+SUMMARY_INFERENCE_CONFIG_JSON = orjson.dumps({
+    "maxTokens": 1024,
+    "temperature": 0.3  # Lower temperature for more consistent JSON output
+})
 
 
 @router.post("/generate-summary", response_model=MoodSummaryResponse)
@@ -235,16 +159,25 @@ async def generate_summary(request: SummaryRequest):
 
     try:
         messages = request.messages
-        logger.info(f"Generating summary for {len(messages)} messages")
+        logger.info("Generating summary for %d messages", len(messages))
 
         if not messages:
             raise HTTPException(status_code=400, detail="No messages provided.")
 
-        # Prepare conversation text for analysis
-        conversation_text = ""
-        for msg in messages:
-            role_label = "User" if msg.role == "user" else "Assistant"
-            conversation_text += f"{role_label}: {msg.content}\n"
+        # Prepare conversation text for analysis (last SUMMARY_MAX_TURNS turns,
+        # at most SUMMARY_MAX_CHARS characters)
+        conversation_text = "\n".join(
+            f"{'User' if msg.role == 'user' else 'Assistant'}: {msg.content}"
+            for msg in messages[-SUMMARY_MAX_TURNS:]
+        )
+        if len(conversation_text) > SUMMARY_MAX_CHARS:
+            conversation_text = conversation_text[-SUMMARY_MAX_CHARS:]
+
+        cache_key = summary_cache_key(conversation_text)
+        cached = await get_cached_summary(cache_key)
+        if cached is not None:
+            logger.info("Serving cached summary")
+            return MoodSummaryResponse(date=today_str(), **cached)
 
         # Create the summary analysis prompt
         analysis_prompt = f"""
@@ -260,58 +193,38 @@ Remember to respond with ONLY valid JSON in the specified format.
             {"role": "user", "content": [{"text": analysis_prompt}]}
         ]
 
-        system_list = [{"text": SUMMARY_SYSTEM_PROMPT}]
-
-        body = json.dumps({
-            "messages": messages_list,
-            "system": system_list,
-            "inferenceConfig": {
-                "maxTokens": 1024,
-                "temperature": 0.3  # Lower temperature for more consistent JSON output
-            },
-            "schemaVersion": "messages-v1"
-        })
-
-        # Call Bedrock to generate summary
-        response = bedrock_runtime.invoke_model(
-            modelId=MODEL_ID,
-            body=body,
-            contentType='application/json',
-            accept='application/json'
-        )
+        body = messages_v1_body(orjson.dumps(messages_list), SUMMARY_SYSTEM_JSON, SUMMARY_INFERENCE_CONFIG_JSON)
 
-        # Parse the response
-        response_body = json.loads(response['body'].read())
-        summary_text = response_body.get('output', {}).get('message', {}).get('content', [{}])[0].get('text', '')
+        # Stream the summary (off the event loop) and stop reading as soon as
+        # the JSON object closes
+        summary_text = await stream_json_object_async(body)
 
-        logger.info(f"Raw summary response: {summary_text}")
+        logger.debug("Raw summary response: %s", summary_text)
 
         # Parse the JSON response from the model
         try:
-            # Clean up the response text to extract JSON
-            json_start = summary_text.find('{')
-            json_end = summary_text.rfind('}') + 1
-            if json_start != -1 and json_end > json_start:
-                json_text = summary_text[json_start:json_end]
-                summary_data = json.loads(json_text)
-            else:
+            # Extract the first balanced JSON object (ignores braces inside
+            # strings and any stray text after it)
+            json_text = find_json_object(summary_text)
+            if json_text is None:
                 raise ValueError("No valid JSON found in response")
+            summary_data = orjson.loads(json_text)
 
             # Add current date and default favorite status
-            from datetime import datetime
-            summary_data['date'] = datetime.now().strftime('%Y-%m-%d')
+            summary_data['date'] = today_str()
             summary_data['isFavorite'] = False
 
-            logger.info(f"Parsed summary data: {summary_data}")
-            
-            return MoodSummaryResponse(**summary_data)
+            logger.debug("Parsed summary data: %s", summary_data)
+
+            response = MoodSummaryResponse(**summary_data)
+            await set_cached_summary(cache_key, response.model_dump(exclude={"date"}))
+            return response
 
-        except (json.JSONDecodeError, ValueError, KeyError) as e:
-            logger.error(f"Failed to parse summary JSON: {e}, Raw text: {summary_text}")
+        except (orjson.JSONDecodeError, ValueError, KeyError) as e:
+            logger.error("Failed to parse summary JSON: %s, Raw text: %s", e, summary_text)
             # Return default sad/stress example as fallback
-            from datetime import datetime
             return MoodSummaryResponse(
-                date=datetime.now().strftime('%Y-%m-%d'),
+                date=today_str(),
                 mood="sad",
                 emotion="sadness",
                 content="Had a conversation about feelings and emotional experiences. The discussion touched on various topics and emotional states.",
@@ -323,11 +236,10 @@ Remember to respond with ONLY valid JSON in the specified format.
     except HTTPException as e:
         raise e
     except Exception as e:
-        logger.error(f"An error occurred during summary generation: {e}")
+        logger.error("An error occurred during summary generation: %s", e)
         # Return fallback response
-        from datetime import datetime
         return MoodSummaryResponse(
-            date=datetime.now().strftime('%Y-%m-%d'),
+            date=today_str(),
             mood="neutral",
             emotion="calm",
             content="Had a conversation with the assistant. The discussion covered various topics and provided a space for reflection.",
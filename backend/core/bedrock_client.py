@@ -0,0 +1,194 @@
+import os
+import asyncio
+import logging
+import boto3
+import orjson
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+from starlette.concurrency import iterate_in_threadpool
+from typing import Optional
+from core.json_extract import JsonObjectScanner
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Model ID for Nova Lite
+MODEL_ID = "amazon.nova-lite-v1:0"
+
+# Bedrock prompt caching: a cachePoint placed right after a static system
+# prompt lets the model reuse that prefix across requests. The prefix must be
+# byte-identical on every call, so anything per-request goes after it.
+PROMPT_CACHING_ENABLED = os.getenv("BEDROCK_PROMPT_CACHING", "true").lower() == "true"
+
+# Latency-optimized inference only exists for some models/regions, so it is
+# opt-in: BEDROCK_LATENCY_OPTIMIZED=1 adds it to every invoke call.
+LATENCY_OPTIMIZED = os.getenv("BEDROCK_LATENCY_OPTIMIZED", "0").lower() in ("1", "true")
+INVOKE_KWARGS = {"performanceConfigLatency": "optimized"} if LATENCY_OPTIMIZED else {}
+
+def cached_system_blocks(static_prompt: str) -> list:
+    """Returns the system[] prefix for a static prompt, with a cache checkpoint if enabled."""
+    blocks = [{"text": static_prompt}]
+    if PROMPT_CACHING_ENABLED:
+        blocks.append({"cachePoint": {"type": "default"}})
+    return blocks
+
+def log_usage(usage: dict):
+    """
+    Logs token usage from a response (or the stream's metadata event),
+    including prompt-cache reads so the cache hit rate can be checked.
+    Nova reports cacheReadInputTokenCount/cacheWriteInputTokenCount; the
+    Converse-style names are accepted too.
+    """
+    if not usage:
+        return
+    logger.info(
+        "Bedrock usage: input=%s output=%s cache_read=%s cache_write=%s",
+        usage.get("inputTokens"),
+        usage.get("outputTokens"),
+        usage.get("cacheReadInputTokenCount", usage.get("cacheReadInputTokens", 0)),
+        usage.get("cacheWriteInputTokenCount", usage.get("cacheWriteInputTokens", 0)),
+    )
+
+# One Bedrock Runtime client per worker process, shared by every router so
+# they all reuse the same keep-alive connection pool instead of each opening
+# (and TLS-handshaking) their own.
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "64"))
+# Fail fast on a dead connection; reads allow for long streamed replies.
+BEDROCK_CONNECT_TIMEOUT = float(os.getenv("BEDROCK_CONNECT_TIMEOUT", "3"))
+BEDROCK_READ_TIMEOUT = float(os.getenv("BEDROCK_READ_TIMEOUT", "60"))
+BEDROCK_MAX_ATTEMPTS = int(os.getenv("BEDROCK_MAX_ATTEMPTS", "3"))
+
+BEDROCK_CONFIG = Config(
+    max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS,
+    connect_timeout=BEDROCK_CONNECT_TIMEOUT,
+    read_timeout=BEDROCK_READ_TIMEOUT,
+    # Adaptive mode adds client-side rate limiting on throttling errors
+    retries={"mode": "adaptive", "max_attempts": BEDROCK_MAX_ATTEMPTS},
+    tcp_keepalive=True,
+)
+
+try:
+    bedrock_runtime = boto3.client(
+        service_name='bedrock-runtime',
+        region_name=os.getenv("AWS_REGION", "us-east-1"),
+        config=BEDROCK_CONFIG,
+    )
+    logger.info("Successfully created shared Bedrock Runtime client.")
+except Exception as e:
+    logger.error(f"Failed to create Bedrock client: {e}")
+    bedrock_runtime = None
+
+def messages_v1_body(messages_json: bytes, system_json: bytes, inference_config_json: bytes) -> bytes:
+    """
+    Splices pre-serialized JSON fragments into a messages-v1 request body, so
+    the static system prompt and inference config are encoded once at import
+    instead of on every request.
+    """
+    return (
+        b'{"messages":' + messages_json
+        + b',"system":' + system_json
+        + b',"inferenceConfig":' + inference_config_json
+        + b',"schemaVersion":"messages-v1"}'
+    )
+
+
+# boto3 is blocking, so Bedrock calls run on a dedicated pool instead of the
+# event loop (or the shared default executor).
+BEDROCK_MAX_WORKERS = int(os.getenv("BEDROCK_MAX_WORKERS", "32"))
+bedrock_executor = ThreadPoolExecutor(max_workers=BEDROCK_MAX_WORKERS, thread_name_prefix="bedrock")
+
+# Caps in-flight Bedrock calls per worker so a burst of requests fans out up
+# to the account's throughput budget and waits on the event loop beyond that,
+# rather than piling up in the executor queue and tripping throttling.
+BEDROCK_MAX_CONCURRENCY = int(os.getenv("BEDROCK_MAX_CONCURRENCY", "32"))
+BEDROCK_SEM = asyncio.Semaphore(BEDROCK_MAX_CONCURRENCY)
+
+
+async def run_in_bedrock_pool(func, *args):
+    """Runs a blocking Bedrock call on the Bedrock pool, within BEDROCK_SEM."""
+    async with BEDROCK_SEM:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(bedrock_executor, func, *args)
+
+
+async def iterate_in_bedrock_limit(iterator):
+    """
+    Iterates a blocking Bedrock stream in the threadpool, holding a BEDROCK_SEM
+    slot until the stream ends so long streamed replies count against the cap.
+    """
+    async with BEDROCK_SEM:
+        async for item in iterate_in_threadpool(iterator):
+            yield item
+
+
+def invoke_model(body) -> dict:
+    """Blocking: invokes MODEL_ID with a JSON body and returns the parsed response."""
+    response = bedrock_runtime.invoke_model(
+        modelId=MODEL_ID,
+        body=body,
+        contentType='application/json',
+        accept='application/json',
+        **INVOKE_KWARGS
+    )
+    response_body = orjson.loads(response['body'].read())
+    log_usage(response_body.get("usage"))
+    return response_body
+
+
+async def invoke_model_async(body) -> dict:
+    """Runs invoke_model on the Bedrock pool so the event loop stays free."""
+    return await run_in_bedrock_pool(invoke_model, body)
+
+
+def extract_delta_text(raw: bytes) -> Optional[str]:
+    """
+    Returns the text of a contentBlockDelta stream event, or None for any
+    other event. A substring check on the raw bytes skips parsing the
+    start/stop/metadata events entirely.
+    """
+    if b'"contentBlockDelta"' not in raw:
+        return None
+    return orjson.loads(raw).get("contentBlockDelta", {}).get("delta", {}).get("text")
+
+
+def stream_json_object(body) -> str:
+    """
+    Blocking: streams MODEL_ID's reply and returns the first complete {...}
+    object as soon as it closes, without waiting for the rest of the output.
+    Returns the whole streamed text if no balanced object ever arrives.
+    """
+    response = bedrock_runtime.invoke_model_with_response_stream(
+        modelId=MODEL_ID,
+        body=body,
+        contentType='application/json',
+        accept='application/json',
+        **INVOKE_KWARGS
+    )
+    stream = response.get('body')
+    if not stream:
+        return ""
+
+    scanner = JsonObjectScanner()
+    parts = []
+    try:
+        for event in stream:
+            chunk = event.get('chunk')
+            if not chunk:
+                continue
+            text = extract_delta_text(chunk.get('bytes'))
+            if not text:
+                continue
+            parts.append(text)
+            json_text = scanner.feed(text)
+            if json_text is not None:
+                return json_text
+    finally:
+        # Drops the rest of the stream (and its connection) if we stopped early
+        stream.close()
+    return "".join(parts)
+
+
+async def stream_json_object_async(body) -> str:
+    """Runs stream_json_object on the Bedrock pool so the event loop stays free."""
+    return await run_in_bedrock_pool(stream_json_object, body)
@@ -0,0 +1,58 @@
+from typing import List, Optional
+
+
+class JsonObjectScanner:
+    """
+    Incremental version of find_json_object: feed text as it streams in and
+    get the first balanced {...} object back as soon as it closes.
+
+    Single linear pass that tracks nesting depth and JSON string/escape state,
+    so braces inside string values are ignored and malformed output can never
+    trigger regex backtracking.
+    """
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> Optional[str]:
+        seg_start = 0
+        for i, ch in enumerate(chunk):
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                    seg_start = i
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(chunk[seg_start:i + 1])
+                    return "".join(self._parts)
+        if self._started:
+            self._parts.append(chunk[seg_start:])
+        return None
+
+
+def find_json_object(text: str) -> Optional[str]:
+    """
+    Returns the first balanced {...} object in text (e.g. an LLM reply wrapped
+    in prose or code fences), or None if there is none.
+    """
+    if not text:
+        return None
+    return JsonObjectScanner().feed(text)
@@ -7,23 +7,122 @@ model_path = os.path.join(current_dir, "..", "notebook", "suicide_mood_model.ker
 model_path = os.path.abspath(model_path)
 print(f"Model Path: {model_path}")
 
+# Optional YuNet face detector (face_detection_yunet_2023mar.onnx from the
+# OpenCV model zoo). When unset or missing, faces are found with the Haar cascade.
+face_model_path = os.getenv("FACE_DETECTOR_MODEL")
+
+# Optional quantized copy of the mood model produced by export_tflite(). When
+# set and present it replaces the Keras model for inference.
+tflite_model_path = os.getenv("MOOD_TFLITE_MODEL")
+
+import threading
+import time
+from collections import deque
 import cv2
 print(cv2.__version__)
 import numpy as np
 import tensorflow as tf
 
+class FrameGrabber(threading.Thread):
+    """Reads frames from a capture device on its own thread, keeping only the latest one"""
+    def __init__(self, cap):
+        super().__init__(daemon=True)
+        self.cap = cap
+        self.frame = None
+        self.frame_id = 0
+        self.cond = threading.Condition()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            with self.cond:
+                self.frame = frame
+                self.frame_id += 1
+                self.cond.notify()
+        self.stop()
+
+    def read(self, last_id):
+        """Wait for a frame newer than last_id; frame is None once capture has stopped"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.frame_id != last_id or self.stopped.is_set())
+            if self.frame_id == last_id:
+                return last_id, None
+            return self.frame_id, self.frame
+
+    def stop(self):
+        with self.cond:
+            self.stopped.set()
+            self.cond.notify_all()
+
+def export_tflite(keras_path, output_path):
+    """Convert the Keras mood model to TFLite with int8 weights (float32 in/out)"""
+    model = tf.keras.models.load_model(keras_path, compile=False)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    # dynamic-range quantization: int8 weights and int8 kernels where
+    # supported, no representative dataset needed
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    with open(output_path, "wb") as f:
+        f.write(converter.convert())
+    return output_path
+
+def clip_box(box, width, height):
+    """Clip an (x, y, w, h) box to the frame; None if nothing of it is left"""
+    x, y, w, h = (int(v) for v in box)
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, width), min(y + h, height)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return (x0, y0, x1 - x0, y1 - y0)
+
 class MoodDetector:
-    def __init__(self, model_path, img_size=(224,224), class_labels=None):
-        self.model = tf.keras.models.load_model(model_path, compile=False)
+    def __init__(self, model_path, img_size=(224,224), class_labels=None, face_model_path=face_model_path,
+                 tflite_model_path=tflite_model_path):
         self.img_size = img_size
+        self.model = None
+        self.interpreter = None
+        if tflite_model_path and os.path.exists(tflite_model_path):
+            self.interpreter = tf.lite.Interpreter(model_path=tflite_model_path)
+            self._input_index = self.interpreter.get_input_details()[0]["index"]
+            self._output_index = self.interpreter.get_output_details()[0]["index"]
+            self._interpreter_batch = None
+        else:
+            self.model = tf.keras.models.load_model(model_path, compile=False)
+            # Trace the forward pass once into a concrete graph function; cv2 sizes
+            # are (width, height) while the tensor is (batch, height, width, channels)
+            self._infer = tf.function(
+                lambda x: self.model(x, training=False),
+                input_signature=[tf.TensorSpec([None, img_size[1], img_size[0], 3], tf.float32)],
+            ).get_concrete_function()
         self.class_labels = class_labels or ["Negative", "Positive"]  # Binary classification
         self.face_cascade = cv2.CascadeClassifier(
             cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
         )
-        # Initialize mood history for temporal tracking
-        self.mood_history = []
+        # DNN detector runs on OpenCV's vectorized CPU backend and is more
+        # accurate than the cascade; input size is set per frame
+        self.face_detector = None
+        if face_model_path and os.path.exists(face_model_path) and hasattr(cv2, "FaceDetectorYN"):
+            self.face_detector = cv2.FaceDetectorYN.create(face_model_path, "", (0, 0), score_threshold=0.6)
         # Maximum history length to prevent memory issues
         self.max_history_length = 100
+        # Initialize mood history for temporal tracking; the deque drops the
+        # oldest entry itself once full
+        self.mood_history = deque(maxlen=self.max_history_length)
+        # Last 5 moods plus running counts over them, updated as entries
+        # slide in and out so each frame does O(1) work
+        self.recent_moods = deque(maxlen=5)
+        self.recent_negative = 0
+        self.recent_changes = 0
+        # Webcam loop runs the Haar cascade only every N frames and tracks
+        # the boxes in between
+        self.detect_every = 10
+        # The cascade scans frames of at least detect_min_height pixels at
+        # detect_scale resolution (0.5 = a quarter of the pixels); smaller
+        # images are scanned as-is so small faces are still found
+        self.detect_scale = 0.5
+        self.detect_min_height = 480
     
     def calculate_risk(self, emotion_probs):
         """Calculate suicide risk score from binary emotion probabilities"""
@@ -45,57 +144,123 @@ class MoodDetector:
     
     def track_mood_changes(self, mood, score):
         """Track mood changes over time to detect concerning patterns"""
-        import time
-        
         # Add current mood to history with timestamp
         self.mood_history.append({
             "mood": mood,
             "score": score,
             "timestamp": time.time()
         })
-        
-        # Limit history length
-        if len(self.mood_history) > self.max_history_length:
-            self.mood_history.pop(0)
-            
+
+        # Slide the 5-entry window: the evicted mood and its pair with the
+        # next one leave the counts, the new mood and its pair enter them
+        recent = self.recent_moods
+        if len(recent) == recent.maxlen:
+            evicted = recent[0]
+            if evicted == "Negative":
+                self.recent_negative -= 1
+            if evicted != recent[1]:
+                self.recent_changes -= 1
+        if recent and recent[-1] != mood:
+            self.recent_changes += 1
+        if mood == "Negative":
+            self.recent_negative += 1
+        recent.append(mood)
+
         # Analyze only if we have enough data
-        if len(self.mood_history) < 5:
+        if len(recent) < recent.maxlen:
             return None
         
-        # Look for concerning patterns
-        recent_moods = self.mood_history[-5:]
-        
         # Check for sustained negative emotions (4+ of last 5 predictions are Negative)
-        negative_count = sum(1 for entry in recent_moods if entry["mood"] == "Negative")
-        if negative_count >= 4:
+        if self.recent_negative >= 4:
             return "ALERT: Sustained negative emotions detected"
         
         # Check for emotional instability (rapid changes between emotions)
-        changes = 0
-        for i in range(1, len(recent_moods)):
-            if recent_moods[i]["mood"] != recent_moods[i-1]["mood"]:
-                changes += 1
-        
-        if changes >= 3:  # 3+ changes in last 5 detections
+        if self.recent_changes >= 3:  # 3+ changes in last 5 detections
             return "ALERT: Emotional instability detected"
             
         return None
     
-    def detect_mood(self, frame):
+    def predict_batch(self, batch):
+        """Run the mood model over a float32 (N, H, W, 3) batch"""
+        if self.interpreter is None:
+            return self._infer(tf.constant(batch)).numpy()
+
+        # TFLite tensors have a fixed shape; only reallocate when the number
+        # of faces changes
+        if batch.shape[0] != self._interpreter_batch:
+            self.interpreter.resize_tensor_input(self._input_index, batch.shape)
+            self.interpreter.allocate_tensors()
+            self._interpreter_batch = batch.shape[0]
+        self.interpreter.set_tensor(self._input_index, batch)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self._output_index)
+
+    def detect_faces(self, frame):
+        """Find faces in a frame and return (x, y, w, h) boxes"""
+        if self.face_detector is not None:
+            height, width = frame.shape[:2]
+            self.face_detector.setInputSize((width, height))
+            _, detections = self.face_detector.detect(frame)
+            if detections is None:
+                return []
+            # YuNet boxes can extend past the frame edges; clip so ROI slicing works
+            faces = (clip_box(det[:4], width, height) for det in detections)
+            return [box for box in faces if box is not None]
+
+        scale = self.detect_scale if frame.shape[0] >= self.detect_min_height else 1.0
+        if scale != 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+        if scale == 1.0:
+            return faces
+        # map boxes back to full-resolution coordinates
+        return [tuple(int(v / scale) for v in box) for box in faces]
+
+    def create_trackers(self, frame, faces):
+        """Start a MOSSE tracker per face; empty if this OpenCV build has none"""
+        # MOSSE lives in opencv-contrib; plain/headless builds lack cv2.legacy
+        if not hasattr(cv2, "legacy"):
+            return []
+        trackers = []
+        for box in faces:
+            tracker = cv2.legacy.TrackerMOSSE_create()
+            tracker.init(frame, tuple(int(v) for v in box))
+            trackers.append(tracker)
+        return trackers
+
+    def update_trackers(self, frame, trackers):
+        """Advance trackers to the new frame and return the boxes still tracked"""
+        height, width = frame.shape[:2]
+        faces = []
+        for tracker in trackers:
+            ok, box = tracker.update(frame)
+            # tracked boxes drift past the edges as a face leaves the frame
+            box = clip_box(box, width, height) if ok else None
+            if box is not None:
+                faces.append(box)
+        return faces
+
+    def detect_mood(self, frame, faces=None):
         """OpenCV detect face and predict mood in a single frame"""
         results = []
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
-        # detect faces in image
-        faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+        # detect faces in image unless the caller already tracked them
+        if faces is None:
+            faces = self.detect_faces(frame)
+
+        if len(faces) == 0:
+            return frame, results
 
-        for (x,y,w,h) in faces:
-            roi = frame[y:y+h, x:x+w] # extract region of interest of face
-            roi = cv2.resize(roi, self.img_size) # resize to match input size expected by trained model
-            roi = roi.astype("float32") / 255.0 # normalize pixel values
-            roi = np.expand_dims(roi, axis=0) # add batch dimension
+        # extract every face, resize to the model input size and scale it
+        # straight into one float32 batch so all faces go through the model in
+        # a single forward pass (no intermediate uint8 stack or float copies)
+        batch = np.empty((len(faces), self.img_size[1], self.img_size[0], 3), dtype=np.float32)
+        for i, (x,y,w,h) in enumerate(faces):
+            np.divide(cv2.resize(frame[y:y+h, x:x+w], self.img_size), 255.0, out=batch[i], dtype=np.float32) # normalize pixel values
+        batch_preds = self.predict_batch(batch)
 
-            preds = self.model.predict(roi, verbose=0)[0] # get model predictions
+        for (x,y,w,h), preds in zip(faces, batch_preds):
             label = self.class_labels[np.argmax(preds)] # get the class with highest prob
             score = float(np.max(preds)) # confidence score
             
@@ -145,14 +310,32 @@ class MoodDetector:
         """Run mood detection on webcam feed"""
         # webcam init
         cap = cv2.VideoCapture(0) 
+        # keep the driver from queueing stale frames behind slow inference
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        # capture on a background thread so camera waits overlap with inference
+        grabber = FrameGrabber(cap)
+        grabber.start()
+        frame_id = 0
+        frame_idx = 0
+        faces = []
+        trackers = []
 
         while True:
-            ret, frame = cap.read()
+            frame_id, frame = grabber.read(frame_id)
 
-            if not ret:
+            if frame is None:
                 break
+
+            # Full detection every detect_every frames; in between follow the
+            # faces with trackers (or keep the last boxes if none available)
+            if frame_idx % self.detect_every == 0:
+                faces = self.detect_faces(frame)
+                trackers = self.create_trackers(frame, faces)
+            elif trackers:
+                faces = self.update_trackers(frame, trackers)
+            frame_idx += 1
                 
-            frame, results = self.detect_mood(frame)
+            frame, results = self.detect_mood(frame, faces)
             
             # Add overall title
             cv2.putText(frame, "Suicide Risk Detection System", 
@@ -175,6 +358,8 @@ class MoodDetector:
             if cv2.waitKey(1) & 0xFF == ord("q"):
                 break
         
+        grabber.stop()
+        grabber.join()
         cap.release()
         cv2.destroyAllWindows()
 
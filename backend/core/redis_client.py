@@ -0,0 +1,19 @@
+import os
+import logging
+from redis.asyncio import Redis
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Shared cache across gunicorn workers. Optional: when REDIS_URL is not set
+# the client is None and callers fall back to their in-process caches.
+REDIS_URL = os.getenv("REDIS_URL")
+
+try:
+    redis_client = Redis.from_url(REDIS_URL, decode_responses=False) if REDIS_URL else None
+    if redis_client is not None:
+        logger.info("Redis client configured for shared caching.")
+except Exception as e:
+    logger.error(f"Failed to create Redis client: {e}")
+    redis_client = None
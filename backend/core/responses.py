@@ -0,0 +1,19 @@
+from fastapi.responses import JSONResponse
+import orjson
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson. Returning it from a route bypasses
+    FastAPI's response_model validation/serialization round-trip, so only use
+    it where the handler already builds the exact payload.
+    """
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        # default=str covers anything orjson can't encode natively (e.g. Decimal)
+        return orjson.dumps(
+            content,
+            default=str,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        )
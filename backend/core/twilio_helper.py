@@ -1,3 +1,4 @@
+import asyncio
 import os
 from twilio.rest import Client
 from typing import Optional
@@ -126,3 +127,26 @@ class TwilioHelper:
                 "error": str(e),
                 "message": "Failed to retrieve call list"
             }
+
+    # The twilio SDK is blocking; async handlers use these wrappers so the
+    # HTTPS round trip to Twilio runs on a worker thread instead of the loop
+    async def make_phone_call_async(self, to_number: str, twiml_url: str = "http://demo.twilio.com/docs/voice.xml") -> dict:
+        return await asyncio.to_thread(self.make_phone_call, to_number, twiml_url)
+
+    async def get_call_status_async(self, call_sid: str) -> dict:
+        return await asyncio.to_thread(self.get_call_status, call_sid)
+
+    async def list_recent_calls_async(self, limit: int = 10) -> dict:
+        return await asyncio.to_thread(self.list_recent_calls, limit)
+
+
+# One helper per process: twilio's Client keeps a pooled requests.Session, so
+# sharing it lets every call reuse open TLS connections to api.twilio.com
+_shared_twilio_helper: Optional[TwilioHelper] = None
+
+def shared_twilio_helper() -> TwilioHelper:
+    """Return the process-wide TwilioHelper, creating it on first use."""
+    global _shared_twilio_helper
+    if _shared_twilio_helper is None:
+        _shared_twilio_helper = TwilioHelper()
+    return _shared_twilio_helper
@@ -0,0 +1,13 @@
+import os
+from uvicorn.workers import UvicornWorker
+
+
+class LimitedUvicornWorker(UvicornWorker):
+    """
+    Uvicorn worker with a per-worker concurrency cap. Once the limit is hit
+    uvicorn answers 503 instead of queueing more work on a saturated loop.
+    """
+    CONFIG_KWARGS = {
+        **UvicornWorker.CONFIG_KWARGS,
+        "limit_concurrency": int(os.getenv("UVICORN_LIMIT_CONCURRENCY", "200")),
+    }
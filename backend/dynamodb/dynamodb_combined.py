@@ -1,17 +1,23 @@
 """
 DynamoDB Combined Router and Client for user-related database operations
 """
+import asyncio
 import boto3
+import hmac
 import os
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from fastapi import APIRouter, BackgroundTasks, HTTPException
+from pydantic import BaseModel, ConfigDict
+from typing import Optional, Dict, Any, List, Tuple
+from botocore.config import Config
 from botocore.exceptions import ClientError, NoCredentialsError
 import logging
 from decimal import Decimal
 import json
 import hashlib
 from datetime import datetime
+from core.responses import ORJSONResponse
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -20,6 +26,42 @@ logger = logging.getLogger(__name__)
 # Initialize router
 router = APIRouter()
 
+# One keep-alive connection pool shared by every request in the worker
+DYNAMODB_CONFIG = Config(
+    max_pool_connections=int(os.getenv("DYNAMODB_MAX_POOL_CONNECTIONS", "64")),
+    tcp_keepalive=True,
+    retries={"mode": "adaptive", "max_attempts": 3},
+)
+
+# Global secondary index on the users table with partition key `email`;
+# login and registration look users up through it instead of scanning.
+USERS_EMAIL_INDEX = os.getenv('USERS_EMAIL_INDEX', 'email-index')
+
+# Passwords are stored as argon2id hashes. Hashing is deliberately slow, so it
+# always runs off the event loop (run_in_executor).
+password_hasher = PasswordHasher()
+
+def hash_password(password: str) -> str:
+    """Blocking: returns the argon2 hash of a password."""
+    return password_hasher.hash(password)
+
+def verify_password(password: str, stored_hash: Optional[str]) -> Tuple[bool, bool]:
+    """
+    Blocking: checks a password against its stored hash and returns
+    (valid, needs_rehash). Accounts registered before argon2 hold an unsalted
+    SHA-256 hex digest; those still verify and are flagged for rehashing.
+    """
+    if not stored_hash:
+        return False, False
+    if not stored_hash.startswith("$argon2"):
+        legacy_hash = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy_hash, stored_hash), True
+    try:
+        password_hasher.verify(stored_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False, False
+    return True, password_hasher.check_needs_rehash(stored_hash)
+
 # Pydantic models
 class UserLogin(BaseModel):
     email: str
@@ -33,9 +75,8 @@ class UserRegistration(BaseModel):
     emergency_contact_name: str = None
     emergency_contact_phone: str = None
     
-    class Config:
-        # Allow extra fields to be ignored
-        extra = "ignore"
+    # Allow extra fields to be ignored
+    model_config = ConfigDict(extra="ignore")
 
 class UserProfile(BaseModel):
     user_id: str
@@ -64,6 +105,8 @@ class DynamoDBClient:
         """
         self.region_name = region_name
         self.table_name = table_name or os.getenv('AWS_DYNAMODB_TABLE')
+        # Table resources by name, built once instead of on every operation
+        self._tables: Dict[str, Any] = {}
         
         try:
             # Initialize DynamoDB client
@@ -72,11 +115,12 @@ class DynamoDBClient:
                     'dynamodb',
                     aws_access_key_id=aws_access_key_id,
                     aws_secret_access_key=aws_secret_access_key,
-                    region_name=region_name
+                    region_name=region_name,
+                    config=DYNAMODB_CONFIG
                 )
             else:
                 # Use default credential chain (environment variables, IAM roles, etc.)
-                self.dynamodb = boto3.resource('dynamodb', region_name=region_name)
+                self.dynamodb = boto3.resource('dynamodb', region_name=region_name, config=DYNAMODB_CONFIG)
                 
             logger.info(f"DynamoDB client initialized for region: {region_name}")
             
@@ -87,29 +131,65 @@ class DynamoDBClient:
             logger.error(f"Failed to initialize DynamoDB client: {str(e)}")
             raise
 
+    def _table(self, name: str):
+        """Return the cached Table resource for a table name"""
+        table_resource = self._tables.get(name)
+        if table_resource is None:
+            table_resource = self._tables[name] = self.dynamodb.Table(name)
+        return table_resource
+
+    def _collect_pages(self,
+                       operation,
+                       request_kwargs: Dict[str, Any],
+                       limit: Optional[int],
+                       page_size: Optional[int]) -> List[Dict[str, Any]]:
+        """
+        Follow LastEvaluatedKey until limit items are collected or the results
+        run out. DynamoDB's Limit caps the items evaluated per request (before
+        any filter), so it is only ever used as the page size.
+        """
+        if page_size or limit:
+            request_kwargs['Limit'] = page_size or limit
+        items = []
+        while True:
+            response = operation(**request_kwargs)
+            items.extend(response.get('Items', []))
+            if limit and len(items) >= limit:
+                return items[:limit]
+            last_key = response.get('LastEvaluatedKey')
+            if last_key is None:
+                return items
+            request_kwargs['ExclusiveStartKey'] = last_key
+
     def _convert_decimals(self, obj):
         """Convert Decimal objects to regular numbers for JSON serialization"""
-        if isinstance(obj, list):
-            return [self._convert_decimals(i) for i in obj]
-        elif isinstance(obj, dict):
+        # The deserializer only produces these exact types, so type() identity
+        # checks replace isinstance(); strings and other leaves fall through
+        obj_type = type(obj)
+        if obj_type is dict:
             return {k: self._convert_decimals(v) for k, v in obj.items()}
-        elif isinstance(obj, Decimal):
-            return float(obj) if obj % 1 != 0 else int(obj)
-        else:
-            return obj
+        if obj_type is list:
+            return [self._convert_decimals(i) for i in obj]
+        if obj_type is Decimal:
+            return int(obj) if obj == obj.to_integral_value() else float(obj)
+        return obj
 
     def put_item(self, 
                 item: Dict[str, Any], 
-                table_name: Optional[str] = None) -> bool:
+                table_name: Optional[str] = None,
+                condition_expression: Optional[str] = None,
+                expression_attribute_values: Optional[Dict[str, Any]] = None) -> bool:
         """
         Put an item into DynamoDB table
         
         Args:
             item: Dictionary representing the item to store
             table_name: DynamoDB table name (optional, uses default if not provided)
+            condition_expression: Only write if this condition holds on the stored item
+            expression_attribute_values: Values for the condition expression
             
         Returns:
-            bool: True if successful, False otherwise
+            bool: True if successful, False otherwise (including a failed condition)
         """
         table = table_name or self.table_name
         if not table:
@@ -117,12 +197,20 @@ class DynamoDBClient:
             return False
             
         try:
-            table_resource = self.dynamodb.Table(table)
-            table_resource.put_item(Item=item)
+            table_resource = self._table(table)
+            put_kwargs = {'Item': item}
+            if condition_expression:
+                put_kwargs['ConditionExpression'] = condition_expression
+            if expression_attribute_values:
+                put_kwargs['ExpressionAttributeValues'] = expression_attribute_values
+            table_resource.put_item(**put_kwargs)
             logger.info(f"Successfully put item in table {table}")
             return True
             
         except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+                logger.info(f"Condition not met; item not put in table {table}")
+                return False
             logger.error(f"Failed to put item: {str(e)}")
             return False
 
@@ -145,7 +233,7 @@ class DynamoDBClient:
             return None
             
         try:
-            table_resource = self.dynamodb.Table(table)
+            table_resource = self._table(table)
             response = table_resource.get_item(Key=key)
             
             if 'Item' in response:
@@ -185,7 +273,7 @@ class DynamoDBClient:
             return False
             
         try:
-            table_resource = self.dynamodb.Table(table)
+            table_resource = self._table(table)
             
             update_kwargs = {
                 'Key': key,
@@ -223,7 +311,7 @@ class DynamoDBClient:
             return False
             
         try:
-            table_resource = self.dynamodb.Table(table)
+            table_resource = self._table(table)
             table_resource.delete_item(Key=key)
             logger.info(f"Successfully deleted item from table {table}")
             return True
@@ -239,7 +327,10 @@ class DynamoDBClient:
                    filter_expression: Optional[str] = None,
                    index_name: Optional[str] = None,
                    limit: Optional[int] = None,
-                   table_name: Optional[str] = None) -> List[Dict[str, Any]]:
+                   page_size: Optional[int] = None,
+                   scan_index_forward: bool = True,
+                   table_name: Optional[str] = None,
+                   raise_errors: bool = False) -> List[Dict[str, Any]]:
         """
         Query items from DynamoDB table
         
@@ -249,8 +340,11 @@ class DynamoDBClient:
             expression_attribute_names: Attribute name mappings (for reserved words)
             filter_expression: Optional filter expression
             index_name: GSI or LSI name to query
-            limit: Maximum number of items to return
+            limit: Maximum number of items to return, across pages
+            page_size: Items evaluated per request (defaults to limit)
+            scan_index_forward: False returns items in descending sort key order
             table_name: DynamoDB table name (optional, uses default if not provided)
+            raise_errors: Re-raise ClientError instead of returning an empty list
             
         Returns:
             list: List of items matching the query
@@ -261,7 +355,7 @@ class DynamoDBClient:
             return []
             
         try:
-            table_resource = self.dynamodb.Table(table)
+            table_resource = self._table(table)
             
             query_kwargs = {
                 'KeyConditionExpression': key_condition_expression,
@@ -274,17 +368,19 @@ class DynamoDBClient:
                 query_kwargs['FilterExpression'] = filter_expression
             if index_name:
                 query_kwargs['IndexName'] = index_name
-            if limit:
-                query_kwargs['Limit'] = limit
+            if not scan_index_forward:
+                query_kwargs['ScanIndexForward'] = False
                 
-            response = table_resource.query(**query_kwargs)
-            
-            items = self._convert_decimals(response.get('Items', []))
+            items = self._convert_decimals(
+                self._collect_pages(table_resource.query, query_kwargs, limit, page_size)
+            )
             logger.info(f"Query returned {len(items)} items from table {table}")
             return items
             
         except ClientError as e:
             logger.error(f"Failed to query items: {str(e)}")
+            if raise_errors:
+                raise
             return []
 
     def scan_items(self, 
@@ -292,6 +388,7 @@ class DynamoDBClient:
                   expression_attribute_values: Optional[Dict[str, Any]] = None,
                   expression_attribute_names: Optional[Dict[str, str]] = None,
                   limit: Optional[int] = None,
+                  page_size: Optional[int] = None,
                   table_name: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Scan items from DynamoDB table
@@ -300,7 +397,8 @@ class DynamoDBClient:
             filter_expression: Filter expression
             expression_attribute_values: Values for the filter expression
             expression_attribute_names: Attribute name mappings (for reserved words)
-            limit: Maximum number of items to return
+            limit: Maximum number of items to return, across pages
+            page_size: Items evaluated per request (defaults to limit)
             table_name: DynamoDB table name (optional, uses default if not provided)
             
         Returns:
@@ -312,7 +410,7 @@ class DynamoDBClient:
             return []
             
         try:
-            table_resource = self.dynamodb.Table(table)
+            table_resource = self._table(table)
             
             scan_kwargs = {}
             
@@ -322,12 +420,10 @@ class DynamoDBClient:
                 scan_kwargs['ExpressionAttributeValues'] = expression_attribute_values
             if expression_attribute_names:
                 scan_kwargs['ExpressionAttributeNames'] = expression_attribute_names
-            if limit:
-                scan_kwargs['Limit'] = limit
                 
-            response = table_resource.scan(**scan_kwargs)
-            
-            items = self._convert_decimals(response.get('Items', []))
+            items = self._convert_decimals(
+                self._collect_pages(table_resource.scan, scan_kwargs, limit, page_size)
+            )
             logger.info(f"Scan returned {len(items)} items from table {table}")
             return items
             
@@ -354,7 +450,7 @@ class DynamoDBClient:
             return False
             
         try:
-            table_resource = self.dynamodb.Table(table)
+            table_resource = self._table(table)
             
             # Process items in batches of 25 (DynamoDB limit)
             for i in range(0, len(items), 25):
@@ -371,6 +467,42 @@ class DynamoDBClient:
             logger.error(f"Failed to batch write items: {str(e)}")
             return False
 
+    def batch_delete_items(self, 
+                          keys: List[Dict[str, Any]], 
+                          table_name: Optional[str] = None) -> bool:
+        """
+        Batch delete items from DynamoDB table
+        
+        Args:
+            keys: List of primary keys of the items to delete
+            table_name: DynamoDB table name (optional, uses default if not provided)
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        table = table_name or self.table_name
+        if not table:
+            logger.error("No table name provided")
+            return False
+            
+        try:
+            table_resource = self._table(table)
+            
+            # Process keys in batches of 25 (DynamoDB limit)
+            for i in range(0, len(keys), 25):
+                batch = keys[i:i+25]
+                
+                with table_resource.batch_writer() as batch_writer:
+                    for key in batch:
+                        batch_writer.delete_item(Key=key)
+                        
+            logger.info(f"Successfully batch deleted {len(keys)} items from table {table}")
+            return True
+            
+        except ClientError as e:
+            logger.error(f"Failed to batch delete items: {str(e)}")
+            return False
+
 # Initialize DynamoDB client with proper credentials
 try:
     db_client = DynamoDBClient(
@@ -401,12 +533,17 @@ async def register_user(user_data: UserRegistration):
         
         print(f"Connected to DynamoDB table: users")
         
-        # Check if user already exists by scanning for email
+        # Check if user already exists via the email index
         print("Checking if user already exists...")
-        existing_users = db_client.scan_items(
-            filter_expression='email = :email',
+        existing_users = await asyncio.to_thread(
+            db_client.query_items,
+            key_condition_expression='email = :email',
             expression_attribute_values={':email': user_data.email},
-            table_name='users'
+            index_name=USERS_EMAIL_INDEX,
+            limit=1,
+            table_name='users',
+            # A missing index must not look like "no such user"
+            raise_errors=True
         )
         
         if existing_users:
@@ -417,8 +554,8 @@ async def register_user(user_data: UserRegistration):
         user_id = f"user_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         print(f"Generated user_id: {user_id}")
         
-        # Hash password (basic - use bcrypt in production)
-        password_hash = hashlib.sha256(user_data.password.encode()).hexdigest()
+        # Hash password with argon2 (off the event loop)
+        password_hash = await asyncio.get_running_loop().run_in_executor(None, hash_password, user_data.password)
         
         # Store user in DynamoDB with proper structure
         timestamp = datetime.now().isoformat()
@@ -436,7 +573,7 @@ async def register_user(user_data: UserRegistration):
         }
         
         print(f"Storing user item: {user_item}")
-        success = db_client.put_item(user_item, table_name='users')
+        success = await asyncio.to_thread(db_client.put_item, user_item, table_name='users')
         
         if not success:
             raise HTTPException(status_code=500, detail="Failed to store user in database")
@@ -459,17 +596,42 @@ async def register_user(user_data: UserRegistration):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
 
+def record_login(key: Dict[str, Any], last_login: str, rehash_password: Optional[str] = None):
+    """
+    Blocking (runs as a background task after /login responds): stores
+    last_login and, when given, upgrades the user's password hash.
+    """
+    update_expression = 'SET last_login = :timestamp'
+    expression_attribute_values = {':timestamp': last_login}
+    if rehash_password is not None:
+        update_expression += ', password = :password'
+        expression_attribute_values[':password'] = hash_password(rehash_password)
+    success = db_client.update_item(
+        key=key,
+        update_expression=update_expression,
+        expression_attribute_values=expression_attribute_values,
+        table_name='users'
+    )
+    
+    if not success:
+        print("Warning: Failed to update last login timestamp")
+
 @router.post("/login")
-async def login_user(login_data: UserLogin):
+async def login_user(login_data: UserLogin, background_tasks: BackgroundTasks):
     """
     Authenticate user and return profile details from users table
     """
     try:
-        # Query by email
-        users = db_client.scan_items(
-            filter_expression='email = :email',
+        # Query by email via the email index
+        users = await asyncio.to_thread(
+            db_client.query_items,
+            key_condition_expression='email = :email',
             expression_attribute_values={':email': login_data.email},
-            table_name='users'
+            index_name=USERS_EMAIL_INDEX,
+            limit=1,
+            table_name='users',
+            # A missing index must not look like "no such user"
+            raise_errors=True
         )
         
         if not users:
@@ -477,31 +639,31 @@ async def login_user(login_data: UserLogin):
         
         user = users[0]
         
-        # Verify password
-        password_hash = hashlib.sha256(login_data.password.encode()).hexdigest()
-        if user.get('password') != password_hash:
+        # Verify password (off the event loop)
+        valid, needs_rehash = await asyncio.get_running_loop().run_in_executor(
+            None, verify_password, login_data.password, user.get('password')
+        )
+        if not valid:
             raise HTTPException(status_code=401, detail="Invalid credentials")
         
-        # Update last login
-        success = db_client.update_item(
-            key={'user_id': user['user_id'], 'timestamp': user['timestamp']},
-            update_expression='SET last_login = :timestamp',
-            expression_attribute_values={':timestamp': datetime.now().isoformat()},
-            table_name='users'
+        # Update last login after the response is sent
+        last_login = datetime.now().isoformat()
+        background_tasks.add_task(
+            record_login,
+            {'user_id': user['user_id'], 'timestamp': user['timestamp']},
+            last_login,
+            login_data.password if needs_rehash else None
         )
         
-        if not success:
-            print("Warning: Failed to update last login timestamp")
-        
-        return {
+        return ORJSONResponse({
             "user_id": user['user_id'],
             "email": user['email'],
             "name": user['name'],
             "phone": user['phone'],
             "emergency_contact_name": user.get('emergency_contact_name'),
             "emergency_contact_phone": user.get('emergency_contact_phone'),
-            "last_login": datetime.now().isoformat()
-        }
+            "last_login": last_login
+        })
         
     except HTTPException:
         raise
@@ -516,20 +678,23 @@ async def get_user_profile(user_id: str):
     Get user profile details from DynamoDB users table
     """
     try:
-        # Query by user_id (partition key)
-        users = db_client.query_items(
+        # Query by user_id (partition key); newest timestamp first, so only
+        # the most recent record is read
+        users = await asyncio.to_thread(
+            db_client.query_items,
             key_condition_expression='user_id = :user_id',
             expression_attribute_values={':user_id': user_id},
+            limit=1,
+            scan_index_forward=False,
             table_name='users'
         )
         
         if not users:
             raise HTTPException(status_code=404, detail="User not found")
         
-        # Get the most recent user record (highest timestamp)
-        user = max(users, key=lambda x: x['timestamp'])
+        user = users[0]
         
-        return {
+        return ORJSONResponse({
             "user_id": user['user_id'],
             "email": user['email'],
             "name": user['name'],
@@ -538,7 +703,7 @@ async def get_user_profile(user_id: str):
             "emergency_contact_phone": user.get('emergency_contact_phone'),
             "created_at": user.get('created_at'),
             "last_login": user.get('last_login')
-        }
+        })
         
     except HTTPException:
         raise
@@ -552,21 +717,25 @@ async def update_user_profile(user_id: str, profile_data: UserProfile):
     Update user profile in DynamoDB
     """
     try:
-        # First, get the current user record
-        users = db_client.query_items(
+        # First, get the current user record; newest timestamp first, so only
+        # the most recent record is read
+        users = await asyncio.to_thread(
+            db_client.query_items,
             key_condition_expression='user_id = :user_id',
             expression_attribute_values={':user_id': user_id},
+            limit=1,
+            scan_index_forward=False,
             table_name='users'
         )
         
         if not users:
             raise HTTPException(status_code=404, detail="User not found")
         
-        # Get the most recent user record
-        user = max(users, key=lambda x: x['timestamp'])
+        user = users[0]
         
         # Update the user record
-        success = db_client.update_item(
+        success = await asyncio.to_thread(
+            db_client.update_item,
             key={'user_id': user['user_id'], 'timestamp': user['timestamp']},
             update_expression='SET #name = :name, phone = :phone, emergency_contact_name = :emergency_contact_name, emergency_contact_phone = :emergency_contact_phone',
             expression_attribute_values={
@@ -600,7 +769,8 @@ async def delete_user_profile(user_id: str):
     """
     try:
         # First, get all user records for this user_id
-        users = db_client.query_items(
+        users = await asyncio.to_thread(
+            db_client.query_items,
             key_condition_expression='user_id = :user_id',
             expression_attribute_values={':user_id': user_id},
             table_name='users'
@@ -610,21 +780,20 @@ async def delete_user_profile(user_id: str):
             raise HTTPException(status_code=404, detail="User not found")
         
         # Delete all user records (in case there are multiple timestamps)
-        success_count = 0
-        for user in users:
-            success = db_client.delete_item(
-                key={'user_id': user['user_id'], 'timestamp': user['timestamp']},
-                table_name='users'
-            )
-            if success:
-                success_count += 1
+        # in one batch request
+        keys = [{'user_id': user['user_id'], 'timestamp': user['timestamp']} for user in users]
+        success = await asyncio.to_thread(
+            db_client.batch_delete_items,
+            keys,
+            table_name='users'
+        )
         
-        if success_count == 0:
+        if not success:
             raise HTTPException(status_code=500, detail="Failed to delete user profile")
         
         return {
             "success": True,
-            "message": f"User profile deleted successfully ({success_count} records removed)"
+            "message": f"User profile deleted successfully ({len(keys)} records removed)"
         }
         
     except HTTPException:
@@ -1,6 +1,12 @@
+import multiprocessing
+import os
+
 bind = "0.0.0.0:8000"
-workers = 2
-worker_class = "uvicorn.workers.UvicornWorker"
+# Each uvicorn worker is a single-threaded event loop that multiplexes many
+# in-flight Bedrock calls, so one worker per core is enough; 2n+1 only
+# duplicates connection pools and caches.
+workers = int(os.getenv("WEB_CONCURRENCY", max(2, multiprocessing.cpu_count())))
+worker_class = "core.uvicorn_worker.LimitedUvicornWorker"
 timeout = 60
 graceful_timeout = 30
-keepalive = 5
\ No newline at end of file
+keepalive = 5
@@ -1,6 +1,8 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES
+import orjson
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -9,9 +11,11 @@ from api import chat, mood_detection, summary, suicide_detection
 from routers import phone, voice_webhooks, ai_calling
 from s3.s3_combined import router as s3_router
 from dynamodb.dynamodb_combined import router as dynamodb_router
+from core.responses import ORJSONResponse
 
 
-app = FastAPI()
+# Every JSON response is rendered with orjson
+app = FastAPI(default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,8 +25,19 @@ app.add_middleware(
         "http://localhost", 
     ],
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    # Explicit lists instead of "*": every method/header the API and the
+    # frontend actually use
+    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_headers=["Content-Type", "Authorization"],
+)
+
+# Compress larger JSON payloads (journal/emotion listings); responses under
+# 512 bytes are sent as-is. The text/plain /chat stream is left alone: each
+# small chunk would be gzipped separately and grow instead of shrink.
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=512,
+    exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES + ("text/plain",)
 )
 
 
@@ -37,16 +52,22 @@ app.include_router(s3_router, prefix="/api", tags=["s3"])
 app.include_router(dynamodb_router, prefix="/api", tags=["dynamodb"])
 app.include_router(suicide_detection.router, prefix="/api", tags=["suicide_detection"])
 
+# Hit constantly by the Docker healthcheck and nginx, so the response is
+# built once and reused
+_HEALTH_RESPONSE = Response(
+    content=orjson.dumps({
+        "status": "healthy",
+        "message": "Backend service is running"
+    }),
+    media_type="application/json"
+)
+
 @app.get("/health")
 async def health_check():
     """
     Health check endpoint for Docker and load balancer
     """
-    return {
-        "status": "healthy",
-        "message": "Backend service is running",
-        "timestamp": datetime.now().isoformat()
-    }
+    return _HEALTH_RESPONSE
 
 @app.get("/")
 def read_root():
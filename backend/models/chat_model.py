@@ -13,6 +13,8 @@ class ChatRequest(BaseModel):
     mood: Optional[str] = None
     risk_score: Optional[float] = None
     custom_prompt: Optional[str] = None
+    # Ask the model to rate suicide risk in the same call as the reply
+    include_risk: bool = False
 
 
 class ChatResponse(BaseModel):
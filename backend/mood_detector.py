@@ -22,6 +22,11 @@ class HappySadDetector:
     def __init__(self, model_path, img_size=(48, 48), class_labels=None):
         self.model = tf.keras.models.load_model(model_path, compile=False)
         self.img_size = img_size
+        # Graph-compiled forward pass, traced once for (N, H, W, 3) RGB faces
+        self._infer = tf.function(
+            lambda x: self.model(x, training=False),
+            input_signature=[tf.TensorSpec([None, img_size[1], img_size[0], 3], tf.float32)],
+        ).get_concrete_function()
         self.class_labels = class_labels or ["Happy", "Sad"]
         self.face_cascade = cv2.CascadeClassifier(
             cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
@@ -65,13 +70,17 @@ class HappySadDetector:
 
         if now - self.last_inference_time >= self.inference_interval:
             self.last_results = []  # reset results
-            for (x, y, w, h) in faces:
-                face = gray[y:y+h, x:x+w]
-                face_resized = cv2.resize(face, self.img_size)
-                face_rgb = cv2.cvtColor(face_resized, cv2.COLOR_GRAY2RGB)
-                face_input = np.expand_dims(face_rgb, axis=0).astype("float32") / 255.0
-
-                preds = self.model.predict(face_input, verbose=0)[0]
+            # Scale every face straight into one float32 batch so they share
+            # one forward pass
+            batch_preds = []
+            if len(faces):
+                batch = np.empty((len(faces), self.img_size[1], self.img_size[0], 3), dtype=np.float32)
+                for i, (x, y, w, h) in enumerate(faces):
+                    face_rgb = cv2.cvtColor(cv2.resize(gray[y:y+h, x:x+w], self.img_size), cv2.COLOR_GRAY2RGB)
+                    np.divide(face_rgb, 255.0, out=batch[i], dtype=np.float32)
+                batch_preds = self._infer(tf.constant(batch)).numpy()
+
+            for (x, y, w, h), preds in zip(faces, batch_preds):
                 label = self.class_labels[np.argmax(preds)]
                 confidence = float(np.max(preds))
 
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, field_validator
 from typing import Optional, List, Dict, Any
 import logging
-from core.twilio_helper import TwilioHelper
+from core.twilio_helper import TwilioHelper, shared_twilio_helper
 import os
+import re
 import json
 from datetime import datetime
 
@@ -13,6 +14,8 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/ai-calling", tags=["ai_calling"])
 
+E164_RE = re.compile(r'^\+[1-9]\d{1,14}$')
+
 # Pydantic models
 class AICallRequest(BaseModel):
     to_number: str
@@ -24,17 +27,17 @@ class AICallRequest(BaseModel):
     user_id: str
     initial_mood: Optional[str] = None
     
-    @validator('to_number')
+    @field_validator('to_number')
+    @classmethod
     def validate_phone_number(cls, v):
-        import re
-        if not re.match(r'^\+[1-9]\d{1,14}$', v):
+        if not E164_RE.match(v):
             raise ValueError('Phone number must be in E.164 format (e.g., +1234567890)')
         return v
     
-    @validator('emergency_number')
+    @field_validator('emergency_number')
+    @classmethod
     def validate_emergency_phone_number(cls, v):
-        import re
-        if not re.match(r'^\+[1-9]\d{1,14}$', v):
+        if not E164_RE.match(v):
             raise ValueError('Emergency phone number must be in E.164 format (e.g., +1234567890)')
         return v
 
@@ -62,7 +65,7 @@ class CallAnalytics(BaseModel):
 # Dependency to get TwilioHelper instance
 def get_twilio_helper():
     try:
-        return TwilioHelper()
+        return shared_twilio_helper()
     except ValueError as e:
         raise HTTPException(status_code=500, detail=f"Twilio configuration error: {str(e)}")
 
@@ -107,7 +110,7 @@ async def initiate_ai_call(
         logger.info(f"Making outbound AI call to {request.to_number} (Name: {request.name}) with webhook: {webhook_url}")
         
         # Make the outbound call using Twilio
-        result = twilio.make_phone_call(
+        result = await twilio.make_phone_call_async(
             to_number=request.to_number,
             twiml_url=webhook_url
         )
@@ -204,7 +207,7 @@ async def ai_calling_health():
     Health check for AI calling service.
     """
     try:
-        twilio = TwilioHelper()
+        twilio = shared_twilio_helper()
         return {
             "status": "healthy",
             "message": "AI calling service is properly configured",
@@ -1,20 +1,23 @@
 from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, field_validator
 import re
-from core.twilio_helper import TwilioHelper
+from core.twilio_helper import TwilioHelper, shared_twilio_helper
 
 # Create router
 router = APIRouter(prefix="/phone", tags=["phone"])
 
+E164_RE = re.compile(r'^\+[1-9]\d{1,14}$')
+
 # Pydantic models for request/response
 class PhoneCallRequest(BaseModel):
     to_number: str
     twiml_url: str = "http://demo.twilio.com/docs/voice.xml"
     
-    @validator('to_number')
+    @field_validator('to_number')
+    @classmethod
     def validate_phone_number(cls, v):
         # Basic phone number validation (E.164 format)
-        if not re.match(r'^\+[1-9]\d{1,14}$', v):
+        if not E164_RE.match(v):
             raise ValueError('Phone number must be in E.164 format (e.g., +1234567890)')
         return v
 
@@ -49,7 +52,7 @@ class CallListResponse(BaseModel):
 # Dependency to get TwilioHelper instance
 def get_twilio_helper():
     try:
-        return TwilioHelper()
+        return shared_twilio_helper()
     except ValueError as e:
         raise HTTPException(status_code=500, detail=f"Twilio configuration error: {str(e)}")
 
@@ -65,7 +68,7 @@ async def make_phone_call(
     - **twiml_url**: TwiML URL for call instructions (optional, defaults to demo)
     """
     try:
-        result = twilio.make_phone_call(
+        result = await twilio.make_phone_call_async(
             to_number=request.to_number,
             twiml_url=request.twiml_url
         )
@@ -94,7 +97,7 @@ async def get_call_status(
     Get the status of a specific call by its SID.
     """
     try:
-        result = twilio.get_call_status(call_sid)
+        result = await twilio.get_call_status_async(call_sid)
         
         if result["success"]:
             return CallStatusResponse(
@@ -124,7 +127,7 @@ async def list_recent_calls(
     - **limit**: Maximum number of calls to return (default: 10)
     """
     try:
-        result = twilio.list_recent_calls(limit=limit)
+        result = await twilio.list_recent_calls_async(limit=limit)
         
         if result["success"]:
             return CallListResponse(
@@ -144,7 +147,7 @@ async def phone_service_health():
     Check if the phone service is properly configured.
     """
     try:
-        twilio = TwilioHelper()
+        twilio = shared_twilio_helper()
         return {
             "status": "healthy",
             "message": "Phone service is properly configured",
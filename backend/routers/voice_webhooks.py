@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Request, HTTPException, Form
+from fastapi import APIRouter, Request, HTTPException, Form, BackgroundTasks
 from fastapi.responses import Response
 from twilio.twiml.voice_response import VoiceResponse, Gather, Say, Pause
 from twilio.twiml.messaging_response import MessagingResponse
 import logging
-import json
 import os
+import re
+from dataclasses import dataclass, field, asdict
 from typing import Optional
-import requests
+import httpx
+import orjson
 from urllib.parse import urlencode
-from core.twilio_helper import TwilioHelper
+from core.twilio_helper import shared_twilio_helper
+from core.redis_client import redis_client
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -16,39 +19,177 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/voice", tags=["voice_webhooks"])
 
-# Store conversation state (in production, use Redis or database)
-conversation_states = {}
+# Shared keep-alive pool for the /api/chat calls made on every speech turn,
+# so each turn skips the TCP handshake and doesn't block the event loop
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=30.0),
+    timeout=30.0,
+)
+
+@router.on_event("shutdown")
+async def close_http_client():
+    await http_client.aclose()
 
-def debug_conversation_states():
-    logger.info(f"Total conversation states: {len(conversation_states)}")
-    for call_sid, state in conversation_states.items():
-        logger.info(f"State {call_sid}: emergency_contact_number={state.emergency_contact_number}")
+# Conversation state lives in Redis keyed by CallSid so every worker/replica
+# sees the same call, and the TTL cleans up calls whose status callback never
+# arrives. Without REDIS_URL it falls back to this in-process dict, which only
+# works with a single worker.
+CONVERSATION_TTL = int(os.getenv("CONVERSATION_TTL", "3600"))
+REDIS_KEY_PREFIX = b"conv:"
+conversation_states = {}
 
+@dataclass
 class ConversationState:
-    def __init__(self, call_sid: str):
-        self.call_sid = call_sid
-        self.message_history = []
-        self.current_mood = None
-        self.risk_score = None
-        self.is_active = True
-        self.ai_response_count = 0
-        self.emergency_contact_number = None 
-        self.emergency_contact_name = None 
-        self.user_name = None  
-        self.context = None 
-        self.custom_prompt = None 
-
-def get_or_create_conversation_state(call_sid: str) -> ConversationState:
+    call_sid: str
+    message_history: list = field(default_factory=list)
+    current_mood: Optional[str] = None
+    risk_score: Optional[float] = None
+    is_active: bool = True
+    ai_response_count: int = 0
+    emergency_contact_number: Optional[str] = None
+    emergency_contact_name: Optional[str] = None
+    user_name: Optional[str] = None
+    context: Optional[str] = None
+    custom_prompt: Optional[str] = None
+    user_id: Optional[str] = None
+
+def _state_key(call_sid: str) -> bytes:
+    return REDIS_KEY_PREFIX + call_sid.encode()
+
+async def load_state(call_sid: str) -> ConversationState:
     """Get or create conversation state for a call"""
-    debug_conversation_states()  # Debug: Check all states
-    if call_sid not in conversation_states:
-        conversation_states[call_sid] = ConversationState(call_sid)
+    if redis_client is None:
+        state = conversation_states.get(call_sid)
+    else:
+        raw = await redis_client.get(_state_key(call_sid))
+        state = ConversationState(**orjson.loads(raw)) if raw is not None else None
+
+    if state is None:
         logger.info(f"Created new conversation state for {call_sid}")
+        return ConversationState(call_sid)
+    logger.info(f"Retrieved existing conversation state for {call_sid}")
+    return state
+
+async def save_state(state: ConversationState) -> None:
+    """
+    Persist conversation state and refresh its TTL. Runs as a background task
+    after the TwiML is sent, so failures are logged rather than raised.
+    """
+    if redis_client is None:
+        conversation_states[state.call_sid] = state
+        return
+    try:
+        await redis_client.set(_state_key(state.call_sid), orjson.dumps(asdict(state)), ex=CONVERSATION_TTL)
+    except Exception as e:
+        logger.error(f"Failed to save conversation state for {state.call_sid}: {str(e)}")
+
+async def delete_state(call_sid: str) -> bool:
+    """Drop conversation state; returns whether there was any"""
+    if redis_client is None:
+        return conversation_states.pop(call_sid, None) is not None
+    return await redis_client.delete(_state_key(call_sid)) > 0
+
+# Goodbye/end call phrases, matched as whole words in one case-insensitive pass
+GOODBYE_RE = re.compile(r"\b(?:goodbye|bye|end call|hang up|stop|quit|exit)\b", re.IGNORECASE)
+
+# Fixed phrases spoken on every call. With VOICE_PROMPT_AUDIO_URL set, each is
+# played from <base>/<prompt id>.mp3 (pre-rendered once, e.g. with Polly) so
+# Twilio skips text-to-speech for them; otherwise they are spoken with <Say>.
+PROMPT_AUDIO_BASE_URL = os.getenv("VOICE_PROMPT_AUDIO_URL", "").rstrip("/")
+PROMPTS = {
+    "low_confidence": "I didn't quite catch that. Could you please speak a bit more clearly?",
+    "still_here_retry": "I'm still here if you'd like to try again.",
+    "goodbye": "Thank you for talking with me today. Take care and remember, I'm always here when you need someone to listen. Goodbye!",
+    "speech_error": "I'm sorry, I'm having trouble understanding right now. Let's try again.",
+    "call_error": "I'm sorry, there was an error. Please try calling again later.",
+    "hold_for_contact": "Please hold while we connect you with your emergency contact.",
+    "connecting": "Connecting you now...",
+    "continue_hold": "Please continue to hold.",
+    "contact_no_answer": "If your emergency contact doesn't answer, please stay on the line and I'll continue to support you.",
+    "conference_error": "I'm sorry, there was an error connecting to your emergency contact.",
+    "connecting_contact": "I'm now connecting you with your emergency contact who can provide additional support.",
+    "still_here_continue": "I'm still here if you'd like to continue our conversation.",
+    "no_input": "I didn't catch that. Please try speaking again.",
+}
+
+def say_prompt(response: VoiceResponse, prompt_id: str) -> None:
+    if PROMPT_AUDIO_BASE_URL:
+        response.play(f"{PROMPT_AUDIO_BASE_URL}/{prompt_id}.mp3")
     else:
-        logger.info(f"Retrieved existing conversation state for {call_sid}")
-    return conversation_states[call_sid]
+        response.say(PROMPTS[prompt_id], voice="alice")
+
+def _low_confidence_twiml() -> str:
+    response = VoiceResponse()
+    say_prompt(response, "low_confidence")
+    gather = Gather(
+        input="speech",
+        action="/voice/webhook/gather",
+        method="POST",
+        speech_timeout="auto",
+        timeout=10,
+        language="en-US"
+    )
+    response.append(gather)
+    say_prompt(response, "still_here_retry")
+    return str(response)
+
+def _goodbye_twiml() -> str:
+    response = VoiceResponse()
+    say_prompt(response, "goodbye")
+    response.hangup()
+    return str(response)
+
+def _speech_error_twiml() -> str:
+    response = VoiceResponse()
+    say_prompt(response, "speech_error")
+    response.redirect("/voice/webhook/gather")
+    return str(response)
+
+def _call_error_twiml() -> str:
+    response = VoiceResponse()
+    say_prompt(response, "call_error")
+    return str(response)
 
-def call_ai_chat_api(message: str, message_history: list = None, mood: str = None, risk_score: float = None, custom_prompt: str = None) -> str:
+def _call_error_hangup_twiml() -> str:
+    response = VoiceResponse()
+    say_prompt(response, "call_error")
+    response.hangup()
+    return str(response)
+
+def _conference_wait_twiml(first: bool) -> str:
+    response = VoiceResponse()
+    if first:
+        # First time - play wait music and brief message
+        say_prompt(response, "hold_for_contact")
+        response.play("https://demo.twilio.com/docs/classic.mp3")
+        response.pause(length=10)
+        say_prompt(response, "connecting")
+        response.redirect(f"/voice/webhook/conference-wait?retry=1")
+    else:
+        # Retry - continue waiting in conference
+        say_prompt(response, "continue_hold")
+        response.pause(length=20)
+        say_prompt(response, "contact_no_answer")
+    return str(response)
+
+def _conference_error_twiml() -> str:
+    response = VoiceResponse()
+    say_prompt(response, "conference_error")
+    response.hangup()
+    return str(response)
+
+# TwiML that never depends on the call is serialized once at import; only the
+# AI-response turns build XML per request
+LOW_CONFIDENCE_TWIML = _low_confidence_twiml()
+GOODBYE_TWIML = _goodbye_twiml()
+SPEECH_ERROR_TWIML = _speech_error_twiml()
+CALL_ERROR_TWIML = _call_error_twiml()
+CALL_ERROR_HANGUP_TWIML = _call_error_hangup_twiml()
+CONFERENCE_WAIT_TWIML = _conference_wait_twiml(first=True)
+CONFERENCE_WAIT_RETRY_TWIML = _conference_wait_twiml(first=False)
+CONFERENCE_ERROR_TWIML = _conference_error_twiml()
+
+async def call_ai_chat_api(message: str, message_history: list = None, mood: str = None, risk_score: float = None, custom_prompt: str = None) -> str:
     """Call the existing AI chat API to get response"""
     try:
         # Get the backend URL from environment or use localhost
@@ -65,31 +206,38 @@ def call_ai_chat_api(message: str, message_history: list = None, mood: str = Non
         
         logger.info(f"Calling AI chat API with payload: {payload}")
         
-        response = requests.post(chat_url, json=payload, timeout=30)
-        
-        if response.status_code == 200:
-            # Handle streaming response properly
-            ai_response = ""
-            try:
-                # Try to get JSON response first
-                data = response.json()
-                ai_response = data.get("message", "I'm here to help.")
-            except:
-                # Fallback to text response
-                ai_response = response.text.strip()
-            
-            logger.info(f"AI Response: {ai_response}")
-            return ai_response
-        else:
-            logger.error(f"AI API error: {response.status_code} - {response.text}")
-            return "I'm sorry, I'm having trouble processing that right now. Could you please try again?"
+        async with http_client.stream(
+            "POST", chat_url, content=orjson.dumps(payload), headers={"Content-Type": "application/json"}
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                logger.error(f"AI API error: {response.status_code} - {response.text}")
+                return "I'm sorry, I'm having trouble processing that right now. Could you please try again?"
+
+            # /api/chat streams the reply as plain text chunks
+            chunks = []
+            async for chunk in response.aiter_text():
+                chunks.append(chunk)
+        body = "".join(chunks)
+
+        ai_response = ""
+        try:
+            # Try to get JSON response first
+            data = orjson.loads(body)
+            ai_response = data.get("message", "I'm here to help.")
+        except Exception:
+            # Fallback to text response
+            ai_response = body.strip()
+        
+        logger.info(f"AI Response: {ai_response}")
+        return ai_response
             
     except Exception as e:
         logger.error(f"Error calling AI API: {str(e)}")
         return "I'm sorry, I'm experiencing technical difficulties. Please try again later."
 
 @router.post("/webhook/answer")
-async def handle_outbound_call(request: Request):
+async def handle_outbound_call(request: Request, background_tasks: BackgroundTasks):
     """
     Handle outbound calls - this is where the call starts when we call someone
     """
@@ -121,7 +269,7 @@ async def handle_outbound_call(request: Request):
         logger.info(f"Context from form: {context}")
         
         # Create conversation state with user context
-        state = get_or_create_conversation_state(call_sid)
+        state = await load_state(call_sid)
         state.current_mood = initial_mood
         state.user_id = user_id
         state.emergency_contact_number = emergency_number
@@ -151,6 +299,7 @@ async def handle_outbound_call(request: Request):
             "role": "assistant", 
             "content": welcome_message
         })
+        background_tasks.add_task(save_state, state)
         
         # Start gathering user input
         gather = Gather(
@@ -164,19 +313,17 @@ async def handle_outbound_call(request: Request):
         response.append(gather)
         
         # Fallback if no input
-        response.say("I didn't catch that. Please try speaking again.", voice="alice")
+        say_prompt(response, "no_input")
         response.redirect("/voice/webhook/gather")
         
         return Response(content=str(response), media_type="application/xml")
         
     except Exception as e:
         logger.error(f"Error handling outbound call: {str(e)}")
-        response = VoiceResponse()
-        response.say("I'm sorry, there was an error. Please try calling again later.", voice="alice")
-        return Response(content=str(response), media_type="application/xml")
+        return Response(content=CALL_ERROR_TWIML, media_type="application/xml")
 
 @router.post("/webhook/gather")
-async def handle_speech_input(request: Request):
+async def handle_speech_input(request: Request, background_tasks: BackgroundTasks):
     """
     Handle speech input from the user
     """
@@ -191,8 +338,13 @@ async def handle_speech_input(request: Request):
         
         logger.info(f"Speech input for {call_sid}: '{speech_result}' (confidence: {confidence})")
         
+        if not speech_result or confidence < 0.3:
+            # Low confidence or no speech detected; nothing to record, so
+            # answer before touching the conversation state
+            return Response(content=LOW_CONFIDENCE_TWIML, media_type="application/xml")
+        
         # Get conversation state
-        state = get_or_create_conversation_state(call_sid)
+        state = await load_state(call_sid)
 
         # DEBUG: Check if state has the data
         logger.info(f"=== STATE DEBUG ===")
@@ -203,22 +355,6 @@ async def handle_speech_input(request: Request):
         logger.info(f"State context: {state.context}")
         logger.info(f"State AI response count: {state.ai_response_count}")
         
-        if not speech_result or confidence < 0.3:
-            # Low confidence or no speech detected
-            response = VoiceResponse()
-            response.say("I didn't quite catch that. Could you please speak a bit more clearly?", voice="alice")
-            gather = Gather(
-                input="speech",
-                action="/voice/webhook/gather",
-                method="POST",
-                speech_timeout="auto",
-                timeout=10,
-                language="en-US"
-            )
-            response.append(gather)
-            response.say("I'm still here if you'd like to try again.", voice="alice")
-            return Response(content=str(response), media_type="application/xml")
-        
         # Add user message to history
         state.message_history.append({
             "role": "user",
@@ -226,15 +362,12 @@ async def handle_speech_input(request: Request):
         })
         
         # Check for goodbye/end call phrases
-        goodbye_phrases = ["goodbye", "bye", "end call", "hang up", "stop", "quit", "exit"]
-        if any(phrase in speech_result.lower() for phrase in goodbye_phrases):
-            response = VoiceResponse()
-            response.say("Thank you for talking with me today. Take care and remember, I'm always here when you need someone to listen. Goodbye!", voice="alice")
-            response.hangup()
-            return Response(content=str(response), media_type="application/xml")
+        if GOODBYE_RE.search(speech_result):
+            background_tasks.add_task(save_state, state)
+            return Response(content=GOODBYE_TWIML, media_type="application/xml")
         
         # Get AI response
-        ai_response = call_ai_chat_api(
+        ai_response = await call_ai_chat_api(
             message=speech_result,
             message_history=state.message_history,
             mood=state.current_mood,
@@ -250,6 +383,7 @@ async def handle_speech_input(request: Request):
 
         # Increment AI response counter
         state.ai_response_count += 1
+        background_tasks.add_task(save_state, state)
         
         # Create TwiML response
         response = VoiceResponse()
@@ -260,7 +394,7 @@ async def handle_speech_input(request: Request):
             # Create conference room
             conference_name = f"crisis_support_{call_sid}"
             
-            response.say("I'm now connecting you with your emergency contact who can provide additional support.", voice="alice")
+            say_prompt(response, "connecting_contact")
             
             # Put current user in conference
             response.dial().conference(
@@ -281,7 +415,7 @@ async def handle_speech_input(request: Request):
             if state.emergency_contact_number:
                 logger.info(f"✅ Attempting to call emergency contact: {state.emergency_contact_number}")
                 try:
-                    twilio = TwilioHelper()
+                    twilio = shared_twilio_helper()
                     
                     # Get backend URL for emergency contact webhook
                     backend_url = os.getenv("BACKEND_URL", "http://localhost:8000")
@@ -299,7 +433,7 @@ async def handle_speech_input(request: Request):
                     emergency_webhook_url += "?" + urlencode(params)
                     
                     # Make the emergency contact call
-                    emergency_result = twilio.make_phone_call(
+                    emergency_result = await twilio.make_phone_call_async(
                         to_number=state.emergency_contact_number,
                         twiml_url=emergency_webhook_url
                     )
@@ -326,17 +460,14 @@ async def handle_speech_input(request: Request):
         response.append(gather)
         
         # Fallback
-        response.say("I'm still here if you'd like to continue our conversation.", voice="alice")
+        say_prompt(response, "still_here_continue")
         response.redirect("/voice/webhook/gather")
         
         return Response(content=str(response), media_type="application/xml")
         
     except Exception as e:
         logger.error(f"Error handling speech input: {str(e)}")
-        response = VoiceResponse()
-        response.say("I'm sorry, I'm having trouble understanding right now. Let's try again.", voice="alice")
-        response.redirect("/voice/webhook/gather")
-        return Response(content=str(response), media_type="application/xml")
+        return Response(content=SPEECH_ERROR_TWIML, media_type="application/xml")
 
 @router.post("/webhook/status")
 async def handle_call_status(request: Request):
@@ -353,8 +484,7 @@ async def handle_call_status(request: Request):
         
         # Clean up conversation state when call ends
         if call_status in ["completed", "busy", "no-answer", "failed", "canceled"]:
-            if call_sid in conversation_states:
-                del conversation_states[call_sid]
+            if await delete_state(call_sid):
                 logger.info(f"Cleaned up conversation state for call {call_sid}")
         
         return Response(content="OK", media_type="text/plain")
@@ -368,15 +498,22 @@ async def get_active_conversations():
     """
     Get list of active conversations (for debugging/monitoring)
     """
+    if redis_client is None:
+        states = list(conversation_states.values())
+    else:
+        keys = [key async for key in redis_client.scan_iter(match=REDIS_KEY_PREFIX + b"*")]
+        raw_states = await redis_client.mget(keys) if keys else []
+        states = [ConversationState(**orjson.loads(raw)) for raw in raw_states if raw is not None]
+
     return {
-        "active_conversations": len(conversation_states),
+        "active_conversations": len(states),
         "conversations": [
             {
-                "call_sid": call_sid,
+                "call_sid": state.call_sid,
                 "message_count": len(state.message_history),
                 "is_active": state.is_active
             }
-            for call_sid, state in conversation_states.items()
+            for state in states
         ]
     }
 
@@ -385,8 +522,7 @@ async def end_conversation(call_sid: str):
     """
     Manually end a conversation (for testing)
     """
-    if call_sid in conversation_states:
-        del conversation_states[call_sid]
+    if await delete_state(call_sid):
         return {"message": f"Conversation {call_sid} ended"}
     else:
         raise HTTPException(status_code=404, detail="Conversation not found")
@@ -400,29 +536,12 @@ async def handle_conference_wait(request: Request):
         call_sid = form_data.get("CallSid")
         retry = request.query_params.get("retry", "0")
         
-        response = VoiceResponse()
-        
-        if retry == "0":
-            # First time - play wait music and brief message
-            response.say("Please hold while we connect you with your emergency contact.", voice="alice")
-            response.play("https://demo.twilio.com/docs/classic.mp3")
-            response.pause(length=10)
-            response.say("Connecting you now...", voice="alice")
-            response.redirect(f"/voice/webhook/conference-wait?retry=1")
-        else:
-            # Retry - continue waiting in conference
-            response.say("Please continue to hold.", voice="alice")
-            response.pause(length=20)
-            response.say("If your emergency contact doesn't answer, please stay on the line and I'll continue to support you.", voice="alice")
-        
-        return Response(content=str(response), media_type="application/xml")
+        twiml = CONFERENCE_WAIT_TWIML if retry == "0" else CONFERENCE_WAIT_RETRY_TWIML
+        return Response(content=twiml, media_type="application/xml")
         
     except Exception as e:
         logger.error(f"Error handling conference wait: {str(e)}")
-        response = VoiceResponse()
-        response.say("I'm sorry, there was an error connecting to your emergency contact.", voice="alice")
-        response.hangup()
-        return Response(content=str(response), media_type="application/xml")
+        return Response(content=CONFERENCE_ERROR_TWIML, media_type="application/xml")
 @router.post("/webhook/emergency-call")
 async def handle_emergency_contact_call(request: Request):
     """Handle when emergency contact answers"""
@@ -456,7 +575,4 @@ async def handle_emergency_contact_call(request: Request):
         
     except Exception as e:
         logger.error(f"Error handling emergency contact call: {str(e)}")
-        response = VoiceResponse()
-        response.say("I'm sorry, there was an error. Please try calling again later.", voice="alice")
-        response.hangup()
-        return Response(content=str(response), media_type="application/xml")
\ No newline at end of file
+        return Response(content=CALL_ERROR_HANGUP_TWIML, media_type="application/xml")
\ No newline at end of file
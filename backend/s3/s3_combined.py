@@ -1,15 +1,23 @@
 """
 S3 Combined Router and Client for emotion-related S3 operations
 """
+import asyncio
 import boto3
+import hashlib
 import os
+import time
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import Optional, Dict, Any, List, Literal
+from typing import Optional, Dict, Any, List, Literal, Tuple
 from botocore.exceptions import ClientError, NoCredentialsError
 import logging
-import json
+import orjson
 from datetime import datetime
+from core.responses import ORJSONResponse
+from core.ttl_cache import TTLCache
+from dynamodb.dynamodb_combined import db_client
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,11 +26,42 @@ logger = logging.getLogger(__name__)
 # Initialize router
 router = APIRouter()
 
-# Define valid emotions
-VALID_EMOTIONS = [
+# Define valid emotions (ordered, for listing and error messages) and a set
+# for membership checks
+VALID_EMOTIONS = (
     "belonging", "calm", "comfort", "disappointment", 
     "gratitude", "hope", "joy", "love", "sadness", "strength"
-]
+)
+_VALID_EMOTIONS_SET = frozenset(VALID_EMOTIONS)
+
+# fetch-all-emotions lists and downloads objects concurrently on this pool
+# (boto3 is blocking); the S3 connection pool is sized to match.
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", "32"))
+s3_executor = ThreadPoolExecutor(max_workers=S3_MAX_CONCURRENCY, thread_name_prefix="s3")
+S3_CONFIG = Config(
+    max_pool_connections=S3_MAX_CONCURRENCY,
+    tcp_keepalive=True,
+    retries={"mode": "adaptive", "max_attempts": 3},
+)
+
+# Emotion objects never change once written, so parsed entries are cached by
+# (key, ETag), and each user's assembled journal by a fingerprint of all of
+# their (key, ETag) pairs: an unchanged jar is served without any GETs.
+EMOTION_CACHE_SIZE = int(os.getenv("EMOTION_CACHE_SIZE", "10000"))
+EMOTION_CACHE_TTL = int(os.getenv("EMOTION_CACHE_TTL", "3600"))
+emotion_object_cache = TTLCache(EMOTION_CACHE_SIZE, EMOTION_CACHE_TTL)
+journal_cache = TTLCache(EMOTION_CACHE_SIZE // 10, EMOTION_CACHE_TTL)
+
+# Journal entries are also stored in DynamoDB (partition user_id, sort
+# entry_id = the entry's S3 key), so a migrated user's jar is one Query
+# instead of a list + GET per entry. Users are migrated from S3 lazily on
+# their first fetch; the marker item (which sorts before every S3 key) says
+# the table holds their complete jar.
+JOURNAL_TABLE = os.getenv('JOURNAL_TABLE', 'journal_entries')
+JOURNAL_MIGRATED_MARKER = "#migrated"
+# The marker's updated_at (time.time_ns()) orders migrations against mirror
+# failures: a failed mirror marks it stale, and a migration only writes it
+# back if its S3 listing started after the last stale mark.
 
 # Pydantic models
 class MediaAttachment(BaseModel):
@@ -83,11 +122,12 @@ class S3Client:
                     's3',
                     aws_access_key_id=aws_access_key_id,
                     aws_secret_access_key=aws_secret_access_key,
-                    region_name=region_name
+                    region_name=region_name,
+                    config=S3_CONFIG
                 )
             else:
                 # Use default credential chain (environment variables, IAM roles, etc.)
-                self.s3_client = boto3.client('s3', region_name=region_name)
+                self.s3_client = boto3.client('s3', region_name=region_name, config=S3_CONFIG)
                 
             logger.info(f"S3 client initialized for region: {region_name}")
             
@@ -304,6 +344,52 @@ except Exception as e:
     print("Please configure AWS credentials in your .env file")
     raise e
 
+def _mirror_journal_entry(s3_key: str, upload_data: Dict[str, Any]):
+    """Writes an uploaded entry to the journal table as well."""
+    # The S3 upload has already succeeded, so mirror failures of any kind are
+    # only logged; failing the request would make the client retry and
+    # upload the entry twice.
+    try:
+        if db_client.put_item({**upload_data, 'entry_id': s3_key}, table_name=JOURNAL_TABLE):
+            return
+    except Exception as e:
+        logger.error(f"Failed to mirror {s3_key} to {JOURNAL_TABLE}: {str(e)}")
+    # The table is now missing an entry, so mark the user's marker stale: the
+    # next fetch falls back to S3 and migrates them again. An overwrite rather
+    # than a delete, so a migration that listed S3 before this upload cannot
+    # put a fresh marker back over it.
+    logger.error(f"Failed to mirror {s3_key} to {JOURNAL_TABLE}; resetting migration marker")
+    try:
+        db_client.put_item(
+            {
+                'user_id': upload_data['user_id'],
+                'entry_id': JOURNAL_MIGRATED_MARKER,
+                'stale': True,
+                'updated_at': time.time_ns()
+            },
+            table_name=JOURNAL_TABLE
+        )
+    except Exception as e:
+        logger.error(f"Failed to reset migration marker for {upload_data['user_id']}: {str(e)}")
+
+def _build_upload_data(emotion_data: EmotionUpload, timestamp: str, upload_time: str) -> Dict[str, Any]:
+    """The stored JournalEntry: the uploaded fields plus upload timestamps."""
+    upload_data = emotion_data.model_dump(mode='json')
+    upload_data["timestamp"] = timestamp
+    upload_data["upload_time"] = upload_time
+    return upload_data
+
+def _put_emotion_entry(s3_key: str, upload_data: Dict[str, Any]):
+    """Blocking: uploads one entry to S3 and mirrors it to the journal table."""
+    s3_client.s3_client.put_object(
+        Bucket='emotion-jar-memories',
+        Key=s3_key,
+        # Serialize straight to bytes for the S3 body
+        Body=orjson.dumps(upload_data),
+        ContentType='application/json'
+    )
+    _mirror_journal_entry(s3_key, upload_data)
+
 @router.post("/uploadEmotionsS3")
 async def upload_emotions_s3(emotion_data: EmotionUpload):
     """
@@ -322,55 +408,31 @@ async def upload_emotions_s3(emotion_data: EmotionUpload):
     """
     try:
         # Validate emotion
-        if emotion_data.emotion not in VALID_EMOTIONS:
+        if emotion_data.emotion not in _VALID_EMOTIONS_SET:
             raise HTTPException(
                 status_code=400, 
-                detail=f"Invalid emotion. Must be one of: {VALID_EMOTIONS}"
+                detail=f"Invalid emotion. Must be one of: {list(VALID_EMOTIONS)}"
             )
         
         # Create timestamp for unique file naming
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        now = datetime.now()
+        timestamp = now.strftime("%Y%m%d_%H%M%S")
         
         # Create the complete JournalEntry data structure to upload
-        upload_data = {
-            "user_id": emotion_data.user_id,
-            "date": emotion_data.date,
-            "mood": emotion_data.mood,
-            "emotion": emotion_data.emotion,
-            "title": emotion_data.title,
-            "content": emotion_data.content,
-            "description": emotion_data.description,
-            "location": emotion_data.location,
-            "people": emotion_data.people,
-            "tags": emotion_data.tags,
-            "gratitude": emotion_data.gratitude,
-            "achievements": emotion_data.achievements,
-            "mediaAttachments": [media.dict() for media in emotion_data.mediaAttachments],
-            "isFavorite": emotion_data.isFavorite,
-            "timestamp": timestamp,
-            "upload_time": datetime.now().isoformat()
-        }
-        
-        # Convert to JSON string
-        json_data = json.dumps(upload_data, indent=2)
+        upload_data = _build_upload_data(emotion_data, timestamp, now.isoformat())
         
         # Create S3 key (file path in bucket) - organized by emotion/user_id
         s3_key = f"{emotion_data.emotion}/{emotion_data.user_id}/{timestamp}.json"
         
-        # Upload to S3 using the configured client
-        s3_client.s3_client.put_object(
-            Bucket='emotion-jar-memories',
-            Key=s3_key,
-            Body=json_data,
-            ContentType='application/json'
-        )
+        # Upload to S3 (and the journal table) off the event loop
+        await asyncio.to_thread(_put_emotion_entry, s3_key, upload_data)
         
-        return {
+        return ORJSONResponse({
             "success": True,
             "message": "Emotion data uploaded successfully",
             "s3_key": s3_key,
             "bucket": "emotion-jar-memories"
-        }
+        })
         
     except HTTPException:
         raise
@@ -395,72 +457,57 @@ async def upload_emotions_s3_batch(batch_data: EmotionBatchUpload):
         results = []
         errors = []
         
-        # Process each entry in the batch
+        # Prepare each entry in the batch; one clock read for the whole batch,
+        # with the entry index in the name so concurrent uploads never collide
+        now = datetime.now()
+        batch_timestamp = now.strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        upload_time = now.isoformat()
+        uploads = []
         for i, emotion_data in enumerate(entries):
-            try:
-                # Validate emotion
-                if emotion_data.emotion not in VALID_EMOTIONS:
-                    errors.append({
-                        "index": i,
-                        "error": f"Invalid emotion: {emotion_data.emotion}. Must be one of: {VALID_EMOTIONS}"
-                    })
-                    continue
-                
-                # Create timestamp for unique file naming
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]  # Include microseconds for uniqueness
-                
-                # Create the complete JournalEntry data structure to upload
-                upload_data = {
-                    "user_id": emotion_data.user_id,
-                    "date": emotion_data.date,
-                    "mood": emotion_data.mood,
-                    "emotion": emotion_data.emotion,
-                    "title": emotion_data.title,
-                    "content": emotion_data.content,
-                    "description": emotion_data.description,
-                    "location": emotion_data.location,
-                    "people": emotion_data.people,
-                    "tags": emotion_data.tags,
-                    "gratitude": emotion_data.gratitude,
-                    "achievements": emotion_data.achievements,
-                    "mediaAttachments": [media.dict() for media in emotion_data.mediaAttachments],
-                    "isFavorite": emotion_data.isFavorite,
-                    "timestamp": timestamp,
-                    "upload_time": datetime.now().isoformat()
-                }
-                
-                # Convert to JSON string
-                json_data = json.dumps(upload_data, indent=2)
-                
-                # Create S3 key (file path in bucket) - organized by emotion/user_id
-                s3_key = f"{emotion_data.emotion}/{emotion_data.user_id}/{timestamp}.json"
-                
-                # Upload to S3 using the configured client
-                s3_client.s3_client.put_object(
-                    Bucket='emotion-jar-memories',
-                    Key=s3_key,
-                    Body=json_data,
-                    ContentType='application/json'
-                )
-                
-                results.append({
+            # Validate emotion
+            if emotion_data.emotion not in _VALID_EMOTIONS_SET:
+                errors.append({
                     "index": i,
-                    "success": True,
-                    "s3_key": s3_key,
-                    "emotion": emotion_data.emotion,
-                    "date": emotion_data.date
+                    "error": f"Invalid emotion: {emotion_data.emotion}. Must be one of: {list(VALID_EMOTIONS)}"
                 })
-                
-            except Exception as e:
+                continue
+            
+            timestamp = f"{batch_timestamp}_{i:04d}"
+            
+            # Create the complete JournalEntry data structure to upload
+            upload_data = _build_upload_data(emotion_data, timestamp, upload_time)
+            
+            # Create S3 key (file path in bucket) - organized by emotion/user_id
+            s3_key = f"{emotion_data.emotion}/{emotion_data.user_id}/{timestamp}.json"
+            uploads.append((i, emotion_data, s3_key, upload_data))
+        
+        # Upload all entries concurrently
+        loop = asyncio.get_running_loop()
+        outcomes = await asyncio.gather(
+            *[loop.run_in_executor(s3_executor, _put_emotion_entry, s3_key, upload_data)
+              for _, _, s3_key, upload_data in uploads],
+            return_exceptions=True
+        )
+        
+        for (i, emotion_data, s3_key, _), outcome in zip(uploads, outcomes):
+            if isinstance(outcome, Exception):
                 errors.append({
                     "index": i,
-                    "error": f"Failed to upload entry: {str(e)}",
+                    "error": f"Failed to upload entry: {str(outcome)}",
                     "emotion": emotion_data.emotion,
                     "date": emotion_data.date
                 })
                 continue
+            results.append({
+                "index": i,
+                "success": True,
+                "s3_key": s3_key,
+                "emotion": emotion_data.emotion,
+                "date": emotion_data.date
+            })
+        errors.sort(key=lambda error: error["index"])
         
-        return {
+        return ORJSONResponse({
             "success": True,
             "message": f"Batch upload completed. {len(results)} successful, {len(errors)} failed.",
             "user_id": user_id,
@@ -469,7 +516,7 @@ async def upload_emotions_s3_batch(batch_data: EmotionBatchUpload):
             "failed_uploads": len(errors),
             "results": results,
             "errors": errors
-        }
+        })
         
     except Exception as e:
         raise HTTPException(
@@ -477,6 +524,106 @@ async def upload_emotions_s3_batch(batch_data: EmotionBatchUpload):
             detail=f"Failed to process batch upload: {str(e)}"
         )
 
+def _query_journal_items(user_id: str) -> Optional[List[Dict[str, Any]]]:
+    """Blocking: all of a user's journal table items in entry_id order, or None on error."""
+    try:
+        return db_client.query_items(
+            key_condition_expression='user_id = :user_id',
+            expression_attribute_values={':user_id': user_id},
+            table_name=JOURNAL_TABLE,
+            raise_errors=True
+        )
+    except Exception as e:
+        logger.error(f"Failed to query {JOURNAL_TABLE}: {str(e)}")
+        return None
+
+def _migrate_journal(user_id: str, keyed_entries: List[Tuple[str, Dict[str, Any]]], listed_at: int):
+    """
+    Blocking: copies a user's S3 entries into the journal table, marker last.
+    Best effort: the journal was already built from S3, so failures are only
+    logged and the next fetch tries again.
+    """
+    items = [{**entry, 'user_id': user_id, 'entry_id': s3_key} for s3_key, entry in keyed_entries]
+    try:
+        if not db_client.batch_write_items(items, table_name=JOURNAL_TABLE):
+            return
+        db_client.put_item(
+            {'user_id': user_id, 'entry_id': JOURNAL_MIGRATED_MARKER, 'updated_at': listed_at},
+            table_name=JOURNAL_TABLE,
+            condition_expression='attribute_not_exists(entry_id) OR updated_at < :listed_at',
+            expression_attribute_values={':listed_at': listed_at}
+        )
+    except Exception as e:
+        logger.error(f"Failed to migrate journal for {user_id}: {str(e)}")
+
+def _build_journal(user_id: str, emotion_entries: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    """Turns (emotion, stored entry) pairs into the frontend's journal format."""
+    journal_entries = {}
+    for emotion, emotion_entry in emotion_entries:
+        # Use the stored data directly (it's already in JournalEntry format)
+        journal_entry = {
+            "user_id": emotion_entry.get('user_id', user_id),
+            "date": emotion_entry.get('date', ''),
+            "mood": emotion_entry.get('mood', 'neutral'),
+            "emotion": emotion_entry.get('emotion', emotion),
+            "title": emotion_entry.get('title'),
+            "content": emotion_entry.get('content', ''),
+            "description": emotion_entry.get('description'),
+            "location": emotion_entry.get('location'),
+            "people": emotion_entry.get('people', []),
+            "tags": emotion_entry.get('tags', []),
+            "gratitude": emotion_entry.get('gratitude', []),
+            "achievements": emotion_entry.get('achievements', []),
+            "mediaAttachments": emotion_entry.get('mediaAttachments', []),
+            "isFavorite": emotion_entry.get('isFavorite', False)
+        }
+
+        # Use date as key, or create unique key if date already exists
+        entry_key = journal_entry['date']
+        counter = 1
+        while entry_key in journal_entries:
+            entry_key = f"{journal_entry['date']}_{counter}"
+            counter += 1
+
+        journal_entries[entry_key] = journal_entry
+
+    return {
+        "user_id": user_id,
+        "journal_entries": journal_entries
+    }
+
+def _list_emotion_keys(emotion: str, user_id: str) -> List[Tuple[str, str]]:
+    """Blocking: lists the (key, ETag) pairs under emotion/user_id/, across all pages."""
+    try:
+        paginator = s3_client.s3_client.get_paginator('list_objects_v2')
+        return [
+            (obj['Key'], obj.get('ETag', ''))
+            for page in paginator.paginate(
+                Bucket='emotion-jar-memories',
+                Prefix=f"{emotion}/{user_id}/",
+                PaginationConfig={'PageSize': 1000}
+            )
+            for obj in page.get('Contents', [])
+        ]
+    except Exception as e:
+        # Skip emotion bucket errors, continue with others
+        print(f"Error accessing emotion bucket {emotion}: {str(e)}")
+        return []
+
+def _read_emotion_object(s3_key: str) -> Optional[Dict[str, Any]]:
+    """Blocking: downloads and parses one emotion entry, or None on error."""
+    try:
+        obj_response = s3_client.s3_client.get_object(
+            Bucket='emotion-jar-memories',
+            Key=s3_key
+        )
+        # Parse the JSON content (orjson takes the raw bytes)
+        return orjson.loads(obj_response['Body'].read())
+    except Exception as e:
+        # Skip individual file errors, continue with others
+        print(f"Error reading file {s3_key}: {str(e)}")
+        return None
+
 @router.post("/fetch-all-emotions")
 async def fetch_all_emotions(user_data: UserEmotionFetch):
     """
@@ -485,11 +632,9 @@ async def fetch_all_emotions(user_data: UserEmotionFetch):
     Returns data in the format expected by the frontend memory system
     """
     try:
-        # Import DynamoDB client to validate user
-        from dynamodb.dynamodb_combined import db_client
-        
         # Validate user exists in users table
-        user_response = db_client.query_items(
+        user_response = await asyncio.to_thread(
+            db_client.query_items,
             key_condition_expression='user_id = :user_id',
             expression_attribute_values={':user_id': user_data.user_id},
             table_name='users'
@@ -499,75 +644,58 @@ async def fetch_all_emotions(user_data: UserEmotionFetch):
             raise HTTPException(status_code=401, detail="Invalid user session")
         
         user_id = user_data.user_id
-        
-        # Fetch actual data from S3
-        journal_entries = {}
-        
-        # Define valid emotions to search for
-        VALID_EMOTIONS = ["belonging", "calm", "comfort", "disappointment", "gratitude", "hope", "joy", "love", "sadness", "strength"]
-        
-        # Fetch data for each emotion bucket
-        for emotion in VALID_EMOTIONS:
-            try:
-                # List all objects in the emotion/user_id/ prefix
-                prefix = f"{emotion}/{user_id}/"
-                files = s3_client.list_files(prefix=prefix, bucket_name='emotion-jar-memories')
-                
-                # If objects exist, fetch and parse each one
-                if files:
-                    for s3_key in files:
-                        try:
-                            # Get the object content using the configured S3 client
-                            obj_response = s3_client.s3_client.get_object(
-                                Bucket='emotion-jar-memories',
-                                Key=s3_key
-                            )
-                            
-                            # Parse the JSON content
-                            content = obj_response['Body'].read().decode('utf-8')
-                            emotion_entry = json.loads(content)
-                            
-                            # Use the data directly from S3 (it's already in JournalEntry format)
-                            journal_entry = {
-                                "user_id": emotion_entry.get('user_id', user_id),
-                                "date": emotion_entry.get('date', ''),
-                                "mood": emotion_entry.get('mood', 'neutral'),
-                                "emotion": emotion_entry.get('emotion', emotion),
-                                "title": emotion_entry.get('title'),
-                                "content": emotion_entry.get('content', ''),
-                                "description": emotion_entry.get('description'),
-                                "location": emotion_entry.get('location'),
-                                "people": emotion_entry.get('people', []),
-                                "tags": emotion_entry.get('tags', []),
-                                "gratitude": emotion_entry.get('gratitude', []),
-                                "achievements": emotion_entry.get('achievements', []),
-                                "mediaAttachments": emotion_entry.get('mediaAttachments', []),
-                                "isFavorite": emotion_entry.get('isFavorite', False)
-                            }
-                            
-                            # Use date as key, or create unique key if date already exists
-                            entry_key = journal_entry['date']
-                            counter = 1
-                            while entry_key in journal_entries:
-                                entry_key = f"{journal_entry['date']}_{counter}"
-                                counter += 1
-                            
-                            journal_entries[entry_key] = journal_entry
-                            
-                        except Exception as e:
-                            # Skip individual file errors, continue with others
-                            print(f"Error reading file {s3_key}: {str(e)}")
-                            continue
-                            
-            except Exception as e:
-                # Skip emotion bucket errors, continue with others
-                print(f"Error accessing emotion bucket {emotion}: {str(e)}")
-                continue
-        
-        return {
-            "user_id": user_id,
-            "journal_entries": journal_entries
-        }
+        loop = asyncio.get_running_loop()
+
+        # Migrated users: the whole jar is one journal table Query
+        items = await loop.run_in_executor(s3_executor, _query_journal_items, user_id)
+        if items and items[0]['entry_id'] == JOURNAL_MIGRATED_MARKER and not items[0].get('stale'):
+            return ORJSONResponse(_build_journal(user_id, [(item.get('emotion'), item) for item in items[1:]]))
+
+        # Otherwise fetch actual data from S3: list every emotion prefix at
+        # once, then download all objects at once; results are consumed in
+        # emotion/key order as before.
+        listed_at = time.time_ns()
+        listings = await asyncio.gather(*[
+            loop.run_in_executor(s3_executor, _list_emotion_keys, emotion, user_id)
+            for emotion in VALID_EMOTIONS
+        ])
+        keyed = [(emotion, obj) for emotion, objs in zip(VALID_EMOTIONS, listings) for obj in objs]
+
+        fingerprint = hashlib.blake2b(
+            "\n".join(f"{key} {etag}" for _, (key, etag) in keyed).encode("utf-8"),
+            digest_size=16
+        ).digest()
+        cached = journal_cache.get((user_id, fingerprint))
+        if cached is not None:
+            return ORJSONResponse(cached)
+
+        # Only download objects that aren't cached yet
+        emotion_entries = [emotion_object_cache.get(obj) for _, obj in keyed]
+        missing = [i for i, entry in enumerate(emotion_entries) if entry is None]
+        downloaded = await asyncio.gather(*[
+            loop.run_in_executor(s3_executor, _read_emotion_object, keyed[i][1][0])
+            for i in missing
+        ])
+        for i, entry in zip(missing, downloaded):
+            if entry is not None:
+                emotion_object_cache.set(keyed[i][1], entry)
+                emotion_entries[i] = entry
+
+        result = _build_journal(user_id, [
+            (emotion, entry) for (emotion, _), entry in zip(keyed, emotion_entries) if entry is not None
+        ])
+        # Don't pin (or migrate) a journal with entries that failed to download
+        if all(entry is not None for entry in emotion_entries):
+            journal_cache.set((user_id, fingerprint), result)
+            if items is not None:
+                await loop.run_in_executor(
+                    s3_executor, _migrate_journal, user_id,
+                    [(obj[0], entry) for (_, obj), entry in zip(keyed, emotion_entries)],
+                    listed_at
+                )
+
+        # Plain dicts already; skip FastAPI's jsonable_encoder pass
+        return ORJSONResponse(result)
         
     except HTTPException:
         raise
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Unit tests import the backend modules directly; boto3 clients are created at
+# import time but never called, so a region is all they need.
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,30 @@
+import pytest
+
+from api.chat import RISK_HEADER_MAX_CHARS, split_risk_header
+
+
+def test_header_is_split_off():
+    assert split_risk_header("<risk>7</risk> Hello there") == (True, 7, "Hello there")
+
+
+def test_leading_whitespace_before_header():
+    assert split_risk_header("\n <risk>2</risk>Hi") == (True, 2, "Hi")
+
+
+@pytest.mark.parametrize("partial", ["", "  ", "<", "<ri", "<risk>", "<risk>1", "<risk>10</ris"])
+def test_partial_header_waits_for_more_text(partial):
+    assert split_risk_header(partial) == (False, None, "")
+
+
+def test_reply_without_header_passes_through():
+    assert split_risk_header("Hello <risk>3</risk>") == (True, None, "Hello <risk>3</risk>")
+
+
+def test_unclosed_header_gives_up_after_max_chars():
+    buffer = "<risk>" + "x" * RISK_HEADER_MAX_CHARS
+    assert split_risk_header(buffer) == (True, None, buffer)
+
+
+def test_invalid_score_is_none():
+    assert split_risk_header("<risk>high</risk>Hi") == (True, None, "Hi")
+    assert split_risk_header("<risk>42</risk>Hi") == (True, None, "Hi")
@@ -0,0 +1,45 @@
+from dynamodb.dynamodb_combined import db_client
+
+
+class FakeOperation:
+    """Serves items in pages of the requested Limit, like a Query or Scan."""
+
+    def __init__(self, total):
+        self.items = [{"n": i} for i in range(total)]
+        self.calls = []
+
+    def __call__(self, **kwargs):
+        self.calls.append(dict(kwargs))
+        start = kwargs.get("ExclusiveStartKey", {}).get("n", -1) + 1
+        page = self.items[start:start + kwargs.get("Limit", len(self.items))]
+        response = {"Items": page}
+        if page and start + len(page) < len(self.items):
+            response["LastEvaluatedKey"] = {"n": page[-1]["n"]}
+        return response
+
+
+def test_collect_pages_without_limit_reads_everything():
+    operation = FakeOperation(5)
+    assert db_client._collect_pages(operation, {}, None, None) == operation.items
+    assert operation.calls == [{}]
+
+
+def test_collect_pages_limit_is_the_page_size_by_default():
+    operation = FakeOperation(10)
+    items = db_client._collect_pages(operation, {}, 3, None)
+    assert items == operation.items[:3]
+    assert [call["Limit"] for call in operation.calls] == [3]
+
+
+def test_collect_pages_follows_pages_up_to_limit():
+    operation = FakeOperation(10)
+    items = db_client._collect_pages(operation, {}, 5, 2)
+    assert items == operation.items[:5]
+    assert [call["Limit"] for call in operation.calls] == [2, 2, 2]
+    assert operation.calls[1]["ExclusiveStartKey"] == {"n": 1}
+
+
+def test_collect_pages_stops_when_results_run_out():
+    operation = FakeOperation(3)
+    assert db_client._collect_pages(operation, {}, 10, 2) == operation.items
+    assert len(operation.calls) == 2
@@ -0,0 +1,12 @@
+from core.json_extract import find_json_object
+
+
+def test_find_json_object_skips_surrounding_prose():
+    assert find_json_object('Sure! ```json\n{"a": 1}\n``` done') == '{"a": 1}'
+    assert find_json_object("no object here") is None
+    assert find_json_object("") is None
+
+
+def test_braces_inside_strings_are_ignored():
+    text = '{"reply": "use } and { freely", "nested": {"q": "\\"}"}} trailing'
+    assert find_json_object(text) == text[:text.rindex("}") + 1]
@@ -0,0 +1,23 @@
+import pytest
+
+from core.json_extract import JsonObjectScanner
+
+
+def feed_all(chunks):
+    scanner = JsonObjectScanner()
+    for chunk in chunks:
+        found = scanner.feed(chunk)
+        if found is not None:
+            return found
+    return None
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+def test_object_split_across_chunks(size):
+    text = 'prefix {"a": {"b": "x}\\"y"}, "c": [1, 2]} suffix {"d": 2}'
+    chunks = [text[i:i + size] for i in range(0, len(text), size)]
+    assert feed_all(chunks) == '{"a": {"b": "x}\\"y"}, "c": [1, 2]}'
+
+
+def test_incomplete_object_returns_none():
+    assert feed_all(['{"a": ', '{"b": 1}']) is None
@@ -0,0 +1,22 @@
+import hashlib
+
+import pytest
+
+from dynamodb.dynamodb_combined import hash_password, verify_password
+
+
+def test_verify_password_accepts_legacy_sha256_and_flags_rehash():
+    legacy = hashlib.sha256("hunter2".encode()).hexdigest()
+    assert verify_password("hunter2", legacy) == (True, True)
+    assert verify_password("wrong", legacy) == (False, True)
+
+
+@pytest.mark.parametrize("stored", [None, ""])
+def test_verify_password_without_hash(stored):
+    assert verify_password("hunter2", stored) == (False, False)
+
+
+def test_verify_password_argon2():
+    stored = hash_password("hunter2")
+    assert verify_password("hunter2", stored) == (True, False)
+    assert verify_password("wrong", stored) == (False, False)
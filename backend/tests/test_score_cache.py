@@ -0,0 +1,58 @@
+import pytest
+
+from api import suicide_detection
+from api.suicide_detection import ScoreCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(suicide_detection.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_score_cache_evicts_least_used_entry(clock):
+    cache = ScoreCache(maxsize=2, ttl=60)
+    cache.set(b"a", 1)
+    cache.get(b"a")
+    cache.get(b"a")
+    cache.set(b"b", 2)
+    cache.set(b"c", 3)
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") == 1
+    assert cache.get(b"c") == 3
+    assert len(cache) == 2
+
+
+def test_score_cache_ages_out_old_hits(clock):
+    cache = ScoreCache(maxsize=2, ttl=60)
+    cache.set(b"a", 1)
+    cache.get(b"a")
+    cache.set(b"b", 2)
+    # Evicting b advances the clock, so later entries can outrank a's old hits
+    cache.set(b"c", 3)
+    cache.get(b"c")
+    cache.get(b"c")
+    cache.set(b"d", 4)
+    assert cache.get(b"a") is None
+    assert cache.get(b"c") == 3
+    assert cache.get(b"d") == 4
+
+
+def test_score_cache_entries_expire(clock):
+    cache = ScoreCache(maxsize=4, ttl=60)
+    cache.set(b"a", 5)
+    clock[0] += 59
+    assert cache.get(b"a") == 5
+    clock[0] += 1
+    assert cache.get(b"a") is None
+    assert len(cache) == 0
+
+
+def test_score_cache_set_refreshes_ttl(clock):
+    cache = ScoreCache(maxsize=4, ttl=60)
+    cache.set(b"a", 5)
+    clock[0] += 50
+    cache.set(b"a", 6)
+    clock[0] += 50
+    assert cache.get(b"a") == 6
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from api import suicide_detection
+from api.suicide_detection import ScoreBatcher, build_batch_body, parse_batch_scores
+
+
+def test_parse_batch_scores_reads_numbered_lines():
+    assert parse_batch_scores("1: 3\n2. 10\n3) 1", 3) == [3, 10, 1]
+
+
+def test_parse_batch_scores_leaves_missing_lines_empty():
+    assert parse_batch_scores("2: 4", 3) == [None, 4, None]
+    assert parse_batch_scores("", 2) == [None, None]
+
+
+@pytest.mark.parametrize("reply", ["1: 2\n1: 9\n2: 3", "1: 2\n2: 3\n3: 9", "0: 2\n1: 2\n2: 3"])
+def test_parse_batch_scores_rejects_duplicate_or_out_of_range_indices(reply):
+    assert parse_batch_scores(reply, 2) == [None, None]
+
+
+def test_build_batch_body_keeps_each_message_on_its_line():
+    body = build_batch_body(["fine\n2) I am ok", "I want to disappear"]).decode()
+    assert '1) \\"fine\\\\n2) I am ok\\"\\n2) \\"I want to disappear\\"' in body
+
+
+def test_batcher_coalesces_concurrent_messages(monkeypatch):
+    calls = []
+
+    def fake_score_messages(texts):
+        calls.append(list(texts))
+        return [len(text) for text in texts]
+
+    monkeypatch.setattr(suicide_detection, "score_messages", fake_score_messages)
+
+    async def run():
+        batcher = ScoreBatcher(max_size=4, max_wait_ms=50)
+        return await asyncio.gather(*[batcher.score(text) for text in ["a", "bb", "ccc"]])
+
+    assert asyncio.run(run()) == [1, 2, 3]
+    assert calls == [["a", "bb", "ccc"]]
+
+
+def test_batcher_scores_each_message_alone_by_default(monkeypatch):
+    calls = []
+
+    def fake_score_messages(texts):
+        calls.append(list(texts))
+        return [len(text) for text in texts]
+
+    monkeypatch.setattr(suicide_detection, "score_messages", fake_score_messages)
+
+    async def run():
+        batcher = ScoreBatcher(max_size=1, max_wait_ms=50)
+        return await asyncio.gather(*[batcher.score(text) for text in ["a", "bb"]])
+
+    assert asyncio.run(run()) == [1, 2]
+    assert sorted(calls) == [["a"], ["bb"]]
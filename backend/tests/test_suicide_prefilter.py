@@ -0,0 +1,53 @@
+import pytest
+
+from api.suicide_detection import prefilter_score
+
+
+@pytest.mark.parametrize("message", [
+    "I'm going to hang myself tonight",
+    "I want to jump off a bridge",
+    "I wish I wasn't alive",
+    "I don't want to wake up tomorrow",
+    "nobody would miss me",
+    "im gonna kms",
+    "yes",
+    "no",
+    "ok bye forever",
+])
+def test_risky_short_messages_are_not_scored_safe(message):
+    assert prefilter_score(message.lower()) != 1
+
+
+@pytest.mark.parametrize("message", ["hi", "Hello!", "thanks", "Thank you :)", "ok", "okay thanks", "good morning"])
+def test_greetings_and_acknowledgements_are_scored_safe(message):
+    assert prefilter_score(message.lower()) == 1
+
+
+@pytest.mark.parametrize("message", ["I want to kill myself", "I’d be better off dead"])
+def test_explicit_phrases_are_scored_high(message):
+    assert prefilter_score(message.lower()) == 10
+
+
+@pytest.mark.parametrize("message", [
+    "I just want to die",
+    "im going to kill myself tonight",
+    "I'm gonna end my life",
+])
+def test_affirmative_first_person_phrases_are_scored_high(message):
+    assert prefilter_score(message.lower()) == 10
+
+
+@pytest.mark.parametrize("message", [
+    "I don't want to die",
+    "I would never kill myself, relax",
+    "I'm not going to kill myself",
+    "I do not want to die",
+    "I dont want to die lol",
+    "Should I kill myself?",
+    "If I wanted to die you would know",
+    "kill myself jk",
+    "My brother said he wants to commit suicide",
+    "do you want to die",
+])
+def test_negated_or_ambiguous_phrases_go_to_the_model(message):
+    assert prefilter_score(message.lower()) is None